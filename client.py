@@ -1,13 +1,16 @@
 # client.py - Run this on each student computer
 
 import socket
-import json
 import sys
 import threading
 import webbrowser
 import time
 import os
 import subprocess
+from urllib.parse import urlparse
+
+from protocol import MessageReader, encode_message
+from linksets import LinkSetCache
 
 class LabClient:
     def __init__(self, server_host, server_port=9999):
@@ -17,6 +20,11 @@ class LabClient:
         self.connected = False
         self.retry_interval = 5  # seconds to wait between connection attempts
         self.max_retries = 0  # 0 means infinite retries
+        self.reader = MessageReader()
+        self.link_set_cache = LinkSetCache()
+        self.pending_link_sets = {}  # {hash: broadcast id} requested from the server
+        self.prepared_hosts = {}  # {host: time last resolved}
+        self.prepare_interval = 60  # seconds before the same host is resolved again
     
     def connect(self):
         retries = 0
@@ -25,6 +33,7 @@ class LabClient:
             try:
                 self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.socket.connect((self.server_host, self.server_port))
+                self.reader = MessageReader()
                 self.connected = True
                 print(f"Connected to server at {self.server_host}:{self.server_port}")
                 return True
@@ -47,11 +56,11 @@ class LabClient:
                     self.connected = False
                     break
                 
-                try:
-                    message = json.loads(data.decode('utf-8'))
-                    self.handle_message(message)
-                except json.JSONDecodeError:
-                    print("Received invalid JSON data")
+                for message in self.reader.feed(data):
+                    if isinstance(message, dict):
+                        self.handle_message(message)
+                    else:
+                        print("Received invalid JSON data")
             
             except Exception as e:
                 print(f"Error receiving data: {e}")
@@ -88,14 +97,24 @@ class LabClient:
             if action == 'open_link' and 'url' in message:
                 url = message['url']
                 print(f"Opening URL: {url}")
-                self.open_url(url)
+                self.send_ack(message.get('id'), self.open_url(url))
             
             elif action == 'open_multiple_links' and 'urls' in message:
                 urls = message['urls']
                 print(f"Opening multiple URLs: {urls}")
-                for url in urls:
-                    self.open_url(url)
-                    time.sleep(0.5)  # Small delay between opening tabs
+                self.send_ack(message.get('id'), self.open_urls(urls))
+            
+            elif action == 'open_link_set' and 'hash' in message:
+                self.open_link_set(message['hash'], message.get('name', ''), message.get('id'))
+            
+            elif action == 'link_set' and 'hash' in message and 'urls' in message:
+                self.receive_link_set(message['hash'], message['urls'])
+            
+            elif action == 'prepare' and 'urls' in message:
+                # Resolve in the background so the next command is not delayed
+                thread = threading.Thread(target=self.prepare_urls, args=(message['urls'],))
+                thread.daemon = True
+                thread.start()
             
             else:
                 print(f"Unknown action: {action}")
@@ -103,10 +122,88 @@ class LabClient:
         except Exception as e:
             print(f"Error handling message: {e}")
     
+    def open_urls(self, urls):
+        ok = True
+        for url in urls:
+            ok = self.open_url(url) and ok
+            time.sleep(0.5)  # Small delay between opening tabs
+        return ok
+    
+    def open_link_set(self, set_hash, name, broadcast_id=None):
+        urls = self.link_set_cache.get(set_hash)
+        if urls is not None:
+            print(f"Opening link set '{name}' from cache: {urls}")
+            self.send_ack(broadcast_id, self.open_urls(urls))
+            return
+        
+        # Cache miss: ask the server for the full list and open it on arrival
+        print(f"Link set '{name}' not cached, requesting it from the server")
+        self.pending_link_sets[set_hash] = broadcast_id
+        self.send_message({"action": "get_link_set", "hash": set_hash})
+    
+    def receive_link_set(self, set_hash, urls):
+        if not self.link_set_cache.put(set_hash, urls):
+            print(f"Received link set does not match hash {set_hash}, ignoring it")
+            return
+        
+        if set_hash in self.pending_link_sets:
+            broadcast_id = self.pending_link_sets.pop(set_hash)
+            print(f"Opening link set {set_hash}: {urls}")
+            self.send_ack(broadcast_id, self.open_urls(urls))
+    
+    def send_ack(self, broadcast_id, ok):
+        # Tells the server the broadcast was opened, which paces wave delivery
+        if broadcast_id is None:
+            return
+        
+        message = {"action": "ack", "id": broadcast_id, "ok": ok}
+        if not ok:
+            message["error"] = "could not open browser"
+        self.send_message(message)
+    
+    def prepare_urls(self, urls):
+        """Resolve the hosts of urls ahead of time.
+        
+        This fills the operating system's DNS cache (the DNS Client service on
+        Windows, mDNSResponder on macOS, systemd-resolved or nscd on Linux),
+        so the browser skips the lookup when the link is opened. Returns the
+        lookup time in milliseconds per host, or None if it failed.
+        """
+        timings = {}
+        for url in urls:
+            parsed = urlparse(url)
+            host = parsed.hostname
+            if not host or host in timings:
+                continue
+            if time.time() - self.prepared_hosts.get(host, 0) < self.prepare_interval:
+                continue
+            
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+            start_time = time.time()
+            try:
+                socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                timings[host] = (time.time() - start_time) * 1000
+                self.prepared_hosts[host] = time.time()
+                print(f"Prepared {host} ({timings[host]:.1f} ms)")
+            except OSError as e:
+                timings[host] = None
+                print(f"Could not resolve {host}: {e}")
+        
+        return timings
+    
+    def send_message(self, message):
+        try:
+            self.socket.sendall(encode_message(message))
+        except Exception as e:
+            print(f"Error sending message to server: {e}")
+    
     def open_url(self, url):
         try:
             # Try to use the default browser
-            webbrowser.open(url, new=2)
+            if webbrowser.open(url, new=2):
+                return True
+            print("No default browser found")
+            return False
         except Exception as e:
             print(f"Error opening URL with default browser: {e}")
             
@@ -120,6 +217,9 @@ class LabClient:
                     subprocess.call(['xdg-open', url])
             except Exception as e2:
                 print(f"Error opening URL with fallback method: {e2}")
+                return False
+        
+        return True
     
     def run(self):
         if self.connect():
@@ -0,0 +1,113 @@
+# handoff.py - Pass the server's sockets to a new process without dropping clients
+#
+# The running server listens on a Unix socket and sends its listening socket
+# and every client socket to its successor with SCM_RIGHTS. Both processes
+# then refer to the same kernel sockets, so when the old process exits the
+# TCP connections stay open and no client notices the restart.
+#
+# Linux only (needs socket.send_fds/recv_fds and SOCK_SEQPACKET).
+
+import json
+import os
+import socket
+import sys
+import tempfile
+
+MAX_FDS_PER_MESSAGE = 200  # The kernel accepts at most 253 per message
+MAX_MESSAGE_SIZE = 65536  # Also the size of each piece of pending client data
+
+
+def is_supported():
+    return sys.platform.startswith('linux') and hasattr(socket, 'send_fds')
+
+
+def handoff_path():
+    return os.path.join(tempfile.gettempdir(), f"linkopener-handoff-{os.getpid()}.sock")
+
+
+def create_handoff_listener(path):
+    """Old process: open the Unix socket the successor will connect to."""
+    if os.path.exists(path):
+        os.remove(path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    listener.bind(path)
+    listener.listen(1)
+    return listener
+
+
+def send_sockets(listener, listen_socket, client_sockets, state, pending=None, timeout=15):
+    """Old process: wait for the successor and send it all sockets.
+
+    pending maps a client key to bytes already read from that client but
+    not yet handled; each entry follows the sockets in messages of its own,
+    so any amount fits. Returns once the successor confirms that it has
+    taken over. Raises an exception if it never connects or does not
+    confirm within timeout.
+    """
+    pending = pending or {}
+    listener.settimeout(timeout)
+    conn, _ = listener.accept()
+    conn.settimeout(timeout)
+
+    try:
+        chunks = [client_sockets[i:i + MAX_FDS_PER_MESSAGE]
+                  for i in range(0, len(client_sockets), MAX_FDS_PER_MESSAGE)]
+
+        header = dict(state, chunks=len(chunks), pending=len(pending))
+        data = json.dumps(header).encode('utf-8')
+        if len(data) > MAX_MESSAGE_SIZE:
+            raise RuntimeError(f"hand-off state is too large ({len(data)} bytes)")
+        socket.send_fds(conn, [data], [listen_socket.fileno()])
+
+        for chunk in chunks:
+            socket.send_fds(conn, [json.dumps({"count": len(chunk)}).encode('utf-8')],
+                            [client_socket.fileno() for client_socket in chunk])
+
+        for key, data in pending.items():
+            conn.send(json.dumps({"key": key, "size": len(data)}).encode('utf-8'))
+            for start in range(0, len(data), MAX_MESSAGE_SIZE):
+                conn.send(data[start:start + MAX_MESSAGE_SIZE])
+
+        reply = conn.recv(MAX_MESSAGE_SIZE)
+        if reply != b"ready":
+            raise RuntimeError("successor did not confirm the hand-off")
+    finally:
+        conn.close()
+
+
+def receive_sockets(path, timeout=15):
+    """New process: connect to the old process and adopt its sockets.
+
+    Returns (conn, listen_socket, client_sockets, state), where
+    state["pending"] maps a client key to its unhandled bytes. Send b"ready"
+    on conn once the sockets are being served, then close it.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    conn.settimeout(timeout)
+    conn.connect(path)
+
+    data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE_SIZE, 1)
+    state = json.loads(data.decode('utf-8'))
+    listen_socket = socket.socket(fileno=fds[0])
+
+    client_sockets = []
+    for _ in range(state.pop("chunks")):
+        data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE_SIZE, MAX_FDS_PER_MESSAGE)
+        client_sockets.extend(socket.socket(fileno=fd) for fd in fds)
+
+    pending = {}
+    for _ in range(state.pop("pending")):
+        entry = json.loads(conn.recv(MAX_MESSAGE_SIZE).decode('utf-8'))
+        pieces = []
+        received = 0
+        while received < entry["size"]:
+            piece = conn.recv(MAX_MESSAGE_SIZE)
+            if not piece:
+                raise RuntimeError("old process closed the hand-off early")
+            pieces.append(piece)
+            received += len(piece)
+        pending[entry["key"]] = b''.join(pieces)
+    state["pending"] = pending
+
+    return conn, listen_socket, client_sockets, state
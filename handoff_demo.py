@@ -0,0 +1,183 @@
+# handoff_demo.py - Restart the server under simulated clients without disconnecting them
+#
+# Usage: python handoff_demo.py [--clients 300] [--port 19999]
+#
+# Starts a headless server in a temporary folder, connects the simulated
+# clients, sends the server SIGUSR1 so it hands its sockets to a new process,
+# then checks that every client is still connected and served by the new
+# process. Throughout the restart every client keeps asking for a link set,
+# sending each request in two pieces, and every request must be answered.
+# Linux only.
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from linksets import link_set_hash
+from protocol import MessageReader, encode_message
+import handoff
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class TrafficClient:
+    """A client that keeps requesting a link set and counts the replies."""
+
+    def __init__(self, port, set_hash, urls, interval):
+        self.socket = socket.create_connection(('127.0.0.1', port))
+        self.request = encode_message({"action": "get_link_set", "hash": set_hash})
+        self.urls = urls
+        self.interval = interval
+        self.sent = 0
+        self.answered = 0
+        self.last_answer_time = None
+        self.connected = True
+        self.stop_event = threading.Event()
+
+        for target in (self.send_loop, self.receive_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def send_loop(self):
+        # Split every request so some are half sent when the restart happens
+        half = len(self.request) // 2
+        while not self.stop_event.is_set():
+            try:
+                self.socket.sendall(self.request[:half])
+                time.sleep(self.interval / 2)
+                self.socket.sendall(self.request[half:])
+            except OSError:
+                self.connected = False
+                return
+            self.sent += 1
+            self.stop_event.wait(self.interval / 2)
+
+    def receive_loop(self):
+        reader = MessageReader()
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except OSError:
+                data = b''
+            if not data:
+                self.connected = False
+                return
+            for message in reader.feed(data):
+                if isinstance(message, dict) and message.get("urls") == self.urls:
+                    self.answered += 1
+                    self.last_answer_time = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Demonstrate a restart without disconnecting clients")
+    parser.add_argument("--clients", type=int, default=300, help="Number of simulated clients")
+    parser.add_argument("--port", type=int, default=19999, help="Port for the demo server")
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between requests from each client")
+    args = parser.parse_args()
+
+    if not handoff.is_supported():
+        print("Socket hand-off needs Linux")
+        sys.exit(1)
+
+    work_dir = tempfile.mkdtemp(prefix="linkopener-demo-")
+    urls = [f"https://example.com/lesson/{i}" for i in range(30)]
+    with open(os.path.join(work_dir, 'link_sets.json'), 'w') as f:
+        json.dump({"demo": urls}, f)
+    set_hash = link_set_hash(urls)
+
+    # Both server processes write to the same log file
+    log_path = os.path.join(work_dir, 'server.log')
+    log_file = open(log_path, 'w')
+
+    print(f"Starting server on port {args.port}, log in {log_path}")
+    server_process = subprocess.Popen(
+        [sys.executable, '-u', SERVER_SCRIPT, '--headless', '--host', '127.0.0.1', '--port', str(args.port)],
+        cwd=work_dir, stdout=log_file, stderr=subprocess.STDOUT
+    )
+    successor_pid = None
+
+    try:
+        if not wait_for_port(args.port):
+            print("Server did not start")
+            sys.exit(1)
+
+        clients = [TrafficClient(args.port, set_hash, urls, args.interval) for _ in range(args.clients)]
+        time.sleep(0.5)
+        print(f"Connected {len(clients)} simulated clients to process {server_process.pid}, "
+              f"each requesting the link set every {args.interval * 1000:.0f} ms")
+
+        start_time = time.time()
+        server_process.send_signal(signal.SIGUSR1)
+        server_process.wait(timeout=30)
+        elapsed = (time.time() - start_time) * 1000
+
+        # The old process logs which process took over before exiting
+        with open(log_path, 'r') as f:
+            for line in f:
+                if line.startswith("Handed"):
+                    print(f"  server: {line.strip()}")
+                    successor_pid = int(line.split("process ")[1].split()[0])
+                    break
+
+        if successor_pid is None:
+            print("Hand-off failed")
+            sys.exit(1)
+        print(f"Old process exited {elapsed:.0f} ms after the restart signal")
+        exit_time = time.time()
+
+        # Keep the traffic going on the new process, then let replies arrive
+        time.sleep(1)
+        for client in clients:
+            client.stop_event.set()
+        time.sleep(1 + args.interval)
+
+        still_connected = sum(1 for client in clients if client.connected)
+        print(f"{still_connected}/{len(clients)} clients still connected")
+
+        served = sum(1 for client in clients if client.last_answer_time and client.last_answer_time > exit_time)
+        print(f"{served}/{len(clients)} clients served by the new process {successor_pid}")
+
+        sent = sum(client.sent for client in clients)
+        answered = sum(client.answered for client in clients)
+        print(f"{answered}/{sent} requests sent during the restart were answered")
+
+        new_client = TrafficClient(args.port, set_hash, urls, args.interval)
+        time.sleep(0.5)
+        new_client.stop_event.set()
+        accepted = new_client.answered > 0
+        print(f"New connections accepted after restart: {'yes' if accepted else 'no'}")
+
+        ok = still_connected == served == len(clients) and answered == sent and accepted
+        print("PASS" if ok else "FAIL")
+        sys.exit(0 if ok else 1)
+    finally:
+        if successor_pid:
+            try:
+                os.kill(successor_pid, signal.SIGTERM)
+            except OSError:
+                pass
+        if server_process.poll() is None:
+            server_process.kill()
+        log_file.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# journal.py - Structured event journal for the lab control server
+
+import json
+import os
+import queue
+import threading
+import time
+
+
+class EventJournal:
+    """Append-only JSON-lines journal written by a background thread.
+
+    Callers only put a tuple on a queue, so recording an event never blocks
+    the accept or receive threads on disk I/O. The writer thread drains the
+    queue in batches and rotates the file once it grows past max_bytes,
+    keeping up to backup_count older files (journal.jsonl.1, .2, ...).
+    """
+
+    def __init__(self, path='journal/journal.jsonl', max_bytes=5 * 1024 * 1024,
+                 backup_count=10, batch_size=256, flush_interval=0.5):
+        self.path = path
+        self.max_bytes = max_bytes  # 0 disables rotation
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.file = None
+        self.is_running = False
+        self.writer_thread = None
+
+    def start(self):
+        if self.is_running:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self.write_loop)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def record(self, event, **fields):
+        # Serialization happens on the writer thread, not here
+        if self.is_running:
+            self.queue.put((time.time(), event, fields))
+
+    def close(self):
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        self.queue.put(None)
+        self.writer_thread.join()
+
+    def write_loop(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            self.write_batch([entry for entry in batch if entry is not None])
+
+            if stop:
+                break
+
+        # Drain anything recorded while shutting down
+        remaining = []
+        while True:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None:
+                remaining.append(entry)
+        self.write_batch(remaining)
+
+        try:
+            self.file.close()
+        except:
+            pass
+
+    def write_batch(self, batch):
+        if not batch:
+            return
+
+        lines = []
+        for timestamp, event, fields in batch:
+            record = {"ts": round(timestamp, 3), "ev": event}
+            record.update(fields)
+            lines.append(json.dumps(record, separators=(',', ':')))
+
+        try:
+            if self.file.closed:
+                # A failed reopen after rotating must not end the journal
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            if self.max_bytes and self.file.tell() >= self.max_bytes:
+                self.rotate()
+        except Exception as e:
+            print(f"Error writing journal: {e}")
+
+    def rotate(self):
+        self.file.close()
+
+        try:
+            if self.backup_count > 0:
+                for i in range(self.backup_count - 1, 0, -1):
+                    source = f"{self.path}.{i}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+        except OSError as e:
+            # On Windows this fails while a reader has the file open; keep
+            # appending to the current file and try again after the next batch
+            print(f"Error rotating journal: {e}")
+        finally:
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+
+def journal_files(path):
+    """Return the journal file and its rotated backups, oldest first."""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_records(path):
+    """Yield journal records one at a time without loading whole files."""
+    for filename in journal_files(path):
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash should not stop the query
+                    continue
@@ -0,0 +1,135 @@
+# journal_query.py - Answer questions from the server's event journal
+#
+# Usage:
+#   python journal_query.py broadcasts [--url TEXT]
+#   python journal_query.py recipients BROADCAST_ID
+#   python journal_query.py client IP_ADDRESS
+#
+# Add --journal PATH to read a journal other than journal/journal.jsonl.
+# Records are streamed one line at a time, so large journals are fine.
+
+import argparse
+import datetime
+import sys
+
+from journal import iter_records
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def list_broadcasts(path, url_filter=None):
+    """Print every broadcast with its delivery counts."""
+    broadcasts = {}  # {id: [record, delivered, failed, opened]}
+    order = []
+
+    for record in iter_records(path):
+        event = record.get("ev")
+        if event == "broadcast":
+            urls = record.get("urls", [])
+            if url_filter and not any(url_filter in url for url in urls):
+                continue
+            broadcasts[record["id"]] = [record, 0, 0, 0]
+            order.append(record["id"])
+        elif event == "deliver" and record.get("id") in broadcasts:
+            entry = broadcasts[record["id"]]
+            if record.get("ok"):
+                entry[1] += 1
+            else:
+                entry[2] += 1
+        elif event == "ack" and record.get("ok") and record.get("id") in broadcasts:
+            broadcasts[record["id"]][3] += 1
+
+    for broadcast_id in order:
+        record, delivered, failed, opened = broadcasts[broadcast_id]
+        urls = record.get("urls", [])
+        first = urls[0] if urls else ""
+        more = f" (+{len(urls) - 1} more)" if len(urls) > 1 else ""
+        print(f"{broadcast_id}  {format_time(record['ts'])}  {record.get('action')}  "
+              f"{delivered} delivered, {failed} failed, {opened} opened  {first}{more}")
+
+    if not order:
+        print("No matching broadcasts found")
+
+
+def list_recipients(path, broadcast_id):
+    """Print which machines received a broadcast and when."""
+    found = False
+
+    for record in iter_records(path):
+        if record.get("id") != broadcast_id:
+            continue
+
+        event = record.get("ev")
+        if event == "broadcast":
+            found = True
+            print(f"Broadcast {broadcast_id} at {format_time(record['ts'])}: "
+                  f"{record.get('action')} {', '.join(record.get('urls', []))}")
+        elif event == "deliver":
+            found = True
+            status = "delivered" if record.get("ok") else "FAILED"
+            print(f"  {format_time(record['ts'])}  {record.get('ip')}:{record.get('port')}  {status}")
+        elif event == "ack":
+            found = True
+            status = "opened" if record.get("ok") else f"ERROR {record.get('error', '')}"
+            print(f"  {format_time(record['ts'])}  {record.get('ip')}:{record.get('port')}  {status}")
+
+    if not found:
+        print(f"No records for broadcast {broadcast_id}")
+
+
+def list_client_history(path, ip):
+    """Print connects, disconnects and deliveries for one machine."""
+    found = False
+
+    for record in iter_records(path):
+        if record.get("ip") != ip:
+            continue
+
+        found = True
+        event = record.get("ev")
+        if event == "deliver":
+            status = "delivered" if record.get("ok") else "FAILED"
+            detail = f"broadcast {record.get('id')} {status}"
+        elif event == "ack":
+            status = "opened" if record.get("ok") else f"ERROR {record.get('error', '')}"
+            detail = f"broadcast {record.get('id')} {status}"
+        elif event == "message":
+            detail = f"message: {record.get('text', record.get('msg', ''))}"
+        else:
+            detail = f"port {record.get('port')}"
+        print(f"{format_time(record['ts'])}  {event}  {detail}")
+
+    if not found:
+        print(f"No records for {ip}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the lab control event journal")
+    parser.add_argument("--journal", default="journal/journal.jsonl", help="Path to the journal file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    broadcasts_parser = subparsers.add_parser("broadcasts", help="List broadcasts")
+    broadcasts_parser.add_argument("--url", help="Only show broadcasts containing this text in a URL")
+
+    recipients_parser = subparsers.add_parser("recipients", help="Show who received a broadcast")
+    recipients_parser.add_argument("broadcast_id")
+
+    client_parser = subparsers.add_parser("client", help="Show the history of one machine")
+    client_parser.add_argument("ip")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "broadcasts":
+            list_broadcasts(args.journal, args.url)
+        elif args.command == "recipients":
+            list_recipients(args.journal, args.broadcast_id)
+        elif args.command == "client":
+            list_client_history(args.journal, args.ip)
+    except BrokenPipeError:
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
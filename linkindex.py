@@ -0,0 +1,177 @@
+# linkindex.py - Fast incremental search over saved links
+
+from bisect import bisect_left, bisect_right
+
+
+class LinkIndex:
+    """Case-insensitive substring search over link names and URLs.
+
+    All entries are kept in one lowercase text, one "name<TAB>url" line per
+    link, so a query is a handful of str.find() calls instead of a Python
+    loop over every link. Matches whose name starts with the query are listed
+    first. A query that extends the previous one only filters the previous
+    results, which keeps typing fast on large libraries. Adding, changing or
+    removing a link edits its line in place instead of rebuilding the text.
+    """
+
+    def __init__(self, links=None):
+        self.links = dict(links or {})  # {name: url} in display order
+        self.dirty = True
+        self.names = []
+        self.lower_names = []
+        self.haystack = ''
+        self.line_starts = []
+        self.last_query = None
+        self.last_matches = None
+
+    def add(self, name, url):
+        """Add a link, or change the URL of an existing one."""
+        existing = name in self.links
+        self.links[name] = url
+        if self.dirty:
+            return
+
+        line = self.line(name, url)
+        if existing:
+            self.replace_line(self.names.index(name), line)
+            return
+
+        index = len(self.names)
+        self.names.append(name)
+        self.lower_names.append(name.lower())
+        if index:
+            self.haystack += '\n'
+        self.line_starts.append(len(self.haystack))
+        self.haystack += line
+        if self.last_query and self.last_query in line:
+            self.last_matches.append(index)
+
+    def remove(self, name):
+        if name not in self.links:
+            return
+        del self.links[name]
+        if self.dirty:
+            return
+
+        index = self.names.index(name)
+        start = self.line_starts[index]
+        if index + 1 < len(self.line_starts):
+            # Drop the line and its newline, then move the later lines up
+            end = self.line_starts[index + 1]
+            self.haystack = self.haystack[:start] + self.haystack[end:]
+            self.shift_lines(index + 1, start - end)
+        else:
+            self.haystack = self.haystack[:max(start - 1, 0)]
+
+        del self.names[index]
+        del self.lower_names[index]
+        del self.line_starts[index]
+        if self.last_matches is not None:
+            self.last_matches = [match - (match > index) for match in self.last_matches if match != index]
+
+    def replace_line(self, index, line):
+        start = self.line_starts[index]
+        end = self.line_starts[index + 1] - 1 if index + 1 < len(self.line_starts) else len(self.haystack)
+        self.haystack = self.haystack[:start] + line + self.haystack[end:]
+        self.shift_lines(index + 1, len(line) - (end - start))
+
+        if self.last_query:
+            matches = self.last_matches
+            position = bisect_left(matches, index)
+            was_match = position < len(matches) and matches[position] == index
+            if self.last_query in line and not was_match:
+                matches.insert(position, index)
+            elif self.last_query not in line and was_match:
+                del matches[position]
+
+    def shift_lines(self, first, offset):
+        line_starts = self.line_starts
+        for index in range(first, len(line_starts)):
+            line_starts[index] += offset
+
+    @staticmethod
+    def line(name, url):
+        return f"{name}\t{url}".lower().replace('\n', ' ')
+
+    def __len__(self):
+        return len(self.links)
+
+    def rebuild(self):
+        self.names = list(self.links)
+        self.lower_names = [name.lower() for name in self.names]
+        lines = [self.line(name, self.links[name]) for name in self.names]
+
+        self.line_starts = []
+        position = 0
+        for line in lines:
+            self.line_starts.append(position)
+            position += len(line) + 1
+        self.haystack = '\n'.join(lines)
+
+        self.dirty = False
+        self.last_query = None
+        self.last_matches = None
+
+    def search(self, query):
+        """Return the names of matching links, name-prefix matches first."""
+        if self.dirty:
+            self.rebuild()
+
+        query = query.strip().lower()
+        if not query:
+            matches = list(range(len(self.names)))
+        elif query == self.last_query:
+            # add() and remove() keep the previous results up to date
+            matches = self.last_matches
+        elif self.last_query and query.startswith(self.last_query):
+            matches = self.filter_matches(self.last_matches, query)
+        else:
+            matches = self.find_matches(query)
+
+        self.last_query = query
+        self.last_matches = matches
+
+        if not query:
+            return list(self.names)
+
+        names = self.names
+        lower_names = self.lower_names
+        prefix_matches = [names[index] for index in matches if lower_names[index].startswith(query)]
+        if len(prefix_matches) == len(matches):
+            return prefix_matches
+        other_matches = [names[index] for index in matches if not lower_names[index].startswith(query)]
+        return prefix_matches + other_matches
+
+    def find_matches(self, query):
+        matches = []
+        haystack = self.haystack
+        line_starts = self.line_starts
+        line_count = len(line_starts)
+        find = haystack.find
+        index = 0
+        position = find(query)
+
+        while position != -1:
+            if index + 1 < line_count and position >= line_starts[index + 1]:
+                index = bisect_right(line_starts, position, index) - 1
+            matches.append(index)
+            # Continue from the next line; one match per link is enough
+            index += 1
+            if index >= line_count:
+                break
+            position = find(query, line_starts[index])
+
+        return matches
+
+    def filter_matches(self, matches, query):
+        haystack = self.haystack
+        line_starts = self.line_starts
+        end_of_text = len(haystack)
+        filtered = []
+
+        for index in matches:
+            end = line_starts[index + 1] - 1 if index + 1 < len(line_starts) else end_of_text
+            if haystack.find(query, line_starts[index], end) != -1:
+                filtered.append(index)
+
+        return filtered
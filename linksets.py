@@ -0,0 +1,64 @@
+# linksets.py - Content-addressed link sets shared by the server and clients
+
+import hashlib
+import json
+import os
+
+
+def link_set_hash(urls):
+    """Identify an ordered list of URLs by a hash of its content."""
+    content = json.dumps(list(urls), separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:20]
+
+
+class LinkSetCache:
+    """Client-side cache of link sets, kept in memory and on disk.
+
+    Entries are keyed by their content hash, so a cached set never goes
+    stale: a changed set simply has a different hash.
+    """
+
+    def __init__(self, directory='link_set_cache'):
+        self.directory = directory
+        self.link_sets = {}  # {hash: urls}
+
+    def get(self, set_hash):
+        if set_hash in self.link_sets:
+            return self.link_sets[set_hash]
+
+        path = self.path_for(set_hash)
+        if path is None or not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                urls = json.load(f)
+        except Exception as e:
+            print(f"Error reading cached link set {set_hash}: {e}")
+            return None
+
+        # Ignore a corrupted file rather than opening the wrong links
+        if link_set_hash(urls) != set_hash:
+            return None
+
+        self.link_sets[set_hash] = urls
+        return urls
+
+    def put(self, set_hash, urls):
+        if link_set_hash(urls) != set_hash:
+            return False
+
+        self.link_sets[set_hash] = urls
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path_for(set_hash), 'w', encoding='utf-8') as f:
+                json.dump(urls, f)
+        except Exception as e:
+            print(f"Error caching link set {set_hash}: {e}")
+        return True
+
+    def path_for(self, set_hash):
+        # Hashes come from the network, so only accept plain hex names
+        if not set_hash or not all(c in '0123456789abcdef' for c in set_hash):
+            return None
+        return os.path.join(self.directory, f"{set_hash}.json")
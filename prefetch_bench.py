@@ -0,0 +1,171 @@
+# prefetch_bench.py - Measure how much a "prepare" speeds up opening a link
+#
+# Usage: python prefetch_bench.py [--domain 127.0.0.1.nip.io] [--trials 20]
+#        python prefetch_bench.py --host NAME --flush [--trials 20]
+#
+# Starts a local stand-in HTTP server and times what a browser does when a
+# link is opened (DNS lookup, TCP connect, first byte), once cold and once
+# after the client has handled a "prepare" message for the link.
+#
+# Every cold run must miss the DNS cache. By default each run therefore uses
+# a name nobody has looked up before, under a wildcard domain whose names all
+# resolve to this machine: 127.0.0.1.nip.io (public, needs internet access),
+# or a wildcard entry such as *.bench.lab.example on your own DNS server for
+# numbers from your network. Alternatively --host uses one fixed name and
+# --flush clears the OS DNS cache before every run; the benchmark stops if
+# the cache cannot be flushed. Names from the hosts file are never slow, so
+# they show no difference.
+
+import argparse
+import http.server
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from client import LabClient
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"<html><body>Lesson page</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def flush_dns_cache():
+    if sys.platform.startswith('win'):
+        command = ['ipconfig', '/flushdns']
+    elif sys.platform.startswith('darwin'):
+        command = ['dscacheutil', '-flushcache']
+    else:
+        command = ['resolvectl', 'flush-caches']
+
+    try:
+        return subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+    except OSError:
+        return False
+
+
+def wait_until_prepared(client, host, timeout=10):
+    # handle_message() resolves on a background thread
+    deadline = time.time() + timeout
+    while host not in client.prepared_hosts:
+        if time.time() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def open_like_browser(host, port):
+    """Return (resolve, connect, first byte) times in milliseconds."""
+    start_time = time.perf_counter()
+    family, socktype, proto, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    resolved_time = time.perf_counter()
+
+    connection = socket.socket(family, socktype, proto)
+    try:
+        connection.connect(address)
+        connected_time = time.perf_counter()
+
+        connection.sendall(f"GET / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('ascii'))
+        first_byte_time = None
+        while True:
+            data = connection.recv(4096)
+            if first_byte_time is None:
+                first_byte_time = time.perf_counter()
+            if not data:
+                break
+    finally:
+        connection.close()
+
+    return (
+        (resolved_time - start_time) * 1000,
+        (connected_time - resolved_time) * 1000,
+        (first_byte_time - start_time) * 1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the effect of preparing links on clients")
+    parser.add_argument("--domain", default="127.0.0.1.nip.io",
+                        help="Wildcard domain resolving to this machine; each run uses a fresh name under it")
+    parser.add_argument("--host", help="Open this one name instead (must reach this machine; needs --flush)")
+    parser.add_argument("--trials", type=int, default=20, help="Number of cold and prepared runs")
+    parser.add_argument("--flush", action="store_true", help="Flush the OS DNS cache before each run")
+    parser.add_argument("--gap", type=float, default=0.2, help="Seconds between prepare and open")
+    args = parser.parse_args()
+
+    if args.host and not args.flush:
+        parser.error("--host needs --flush, or every run after the first is served from the DNS cache")
+    if args.flush and not flush_dns_cache():
+        print("Could not flush the DNS cache (no supported cache or no permission)")
+        sys.exit(1)
+
+    # A random tag keeps names fresh across repeated benchmark runs too
+    tag = secrets.token_hex(4)
+    if not args.host:
+        try:
+            socket.getaddrinfo(f"check-{tag}.{args.domain}", None)
+        except OSError as e:
+            print(f"Names under {args.domain} do not resolve ({e}); use --domain or --host with --flush")
+            sys.exit(1)
+
+    stand_in = http.server.ThreadingHTTPServer(('', 0), StandInHandler)
+    port = stand_in.server_address[1]
+    thread = threading.Thread(target=stand_in.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    client = LabClient('127.0.0.1')
+    if args.host:
+        print(f"Stand-in server at {args.host}:{port}, {args.trials} trials with a flushed DNS cache")
+    else:
+        print(f"Stand-in server on port {port}, {args.trials} trials with fresh names under {args.domain}")
+
+    cold = []
+    prepared = []
+    for trial in range(args.trials):
+        if args.host:
+            cold_host = prepared_host = args.host
+        else:
+            cold_host = f"cold-{tag}-{trial}.{args.domain}"
+            prepared_host = f"prep-{tag}-{trial}.{args.domain}"
+
+        # Both runs wait the same gap so only the prepare differs
+        if args.flush:
+            flush_dns_cache()
+        time.sleep(args.gap)
+        cold.append(open_like_browser(cold_host, port))
+
+        if args.flush:
+            flush_dns_cache()
+        client.prepared_hosts.clear()
+        # The same path a prepare message from the server takes
+        client.handle_message({"action": "prepare", "urls": [f"http://{prepared_host}:{port}/"]})
+        if not wait_until_prepared(client, prepared_host):
+            print(f"Prepare of {prepared_host} did not finish; its run may include the lookup")
+        time.sleep(args.gap)
+        prepared.append(open_like_browser(prepared_host, port))
+
+    stand_in.shutdown()
+
+    print(f"\n{'median ms':<12}{'resolve':>10}{'connect':>10}{'first byte':>12}")
+    for label, runs in (("cold", cold), ("prepared", prepared)):
+        medians = [statistics.median(run[i] for run in runs) for i in range(3)]
+        print(f"{label:<12}{medians[0]:>10.2f}{medians[1]:>10.2f}{medians[2]:>12.2f}")
+
+    saved = statistics.median(run[2] for run in cold) - statistics.median(run[2] for run in prepared)
+    print(f"\nOpening after prepare was {saved:.2f} ms faster to first byte (median)")
+
+if __name__ == "__main__":
+    main()
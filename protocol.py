@@ -0,0 +1,107 @@
+# protocol.py - Shared helpers for the JSON messages sent between server and client
+
+import codecs
+import json
+
+MAX_BUFFERED = 1024 * 1024  # Drop a partial message that grows past 1 MB
+
+_decoder = json.JSONDecoder()
+
+
+class MessageReader:
+    """Turn a stream of received bytes into complete messages.
+
+    Messages end with a newline, but older peers send them back to back
+    without one, so one recv() may hold several of them or only part of one.
+    JSON objects are returned as dicts; anything else (such as plain text or
+    a malformed object) is returned as a string.
+    """
+
+    def __init__(self):
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.buffer = ''
+
+    def feed(self, data):
+        self.buffer += self.text_decoder.decode(data)
+        messages, self.buffer = split_messages(self.buffer)
+        return messages
+
+    def pending(self):
+        """Return the bytes received so far that are not yet a message."""
+        undecoded, _ = self.text_decoder.getstate()
+        return self.buffer.encode('utf-8') + undecoded
+
+
+def split_messages(buffer):
+    """Split buffer into complete messages and the incomplete remainder."""
+    messages = []
+    position = 0
+    length = len(buffer)
+
+    while True:
+        while position < length and buffer[position].isspace():
+            position += 1
+        if position >= length:
+            return messages, ''
+
+        if buffer[position] != '{':
+            # Plain text runs up to the next JSON object
+            next_object = buffer.find('{', position)
+            end = length if next_object == -1 else next_object
+            messages.append(buffer[position:end].strip())
+            position = end
+            continue
+
+        try:
+            message, position = _decoder.raw_decode(buffer, position)
+            messages.append(message)
+        except json.JSONDecodeError:
+            end = malformed_object_end(buffer, position)
+            if end == -1:
+                # The rest has not arrived yet
+                rest = buffer[position:]
+                if len(rest) > MAX_BUFFERED:
+                    return messages, ''
+                return messages, rest
+
+            # Hand the bad object on as text so later messages still parse
+            messages.append(buffer[position:end].strip())
+            position = end
+
+
+def malformed_object_end(buffer, start):
+    """Return where a complete but invalid object starting at start ends.
+
+    The object is complete once its braces balance (ignoring braces inside
+    strings) or a newline ends it. Returns -1 if it may still be arriving.
+    """
+    newline = buffer.find('\n', start)
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for index in range(start, len(buffer) if newline == -1 else newline):
+        char = buffer[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+
+    return -1 if newline == -1 else newline + 1
+
+
+def encode_message(message):
+    # The newline lets a reader tell a malformed message from a partial one
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
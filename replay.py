@@ -0,0 +1,513 @@
+# replay.py - Re-drive recorded server traffic against a local build and measure it
+#
+# Usage: python replay.py CAPTURE [--speed 1] [--build DIR] [--output results.json]
+#                                 [--compare baseline.json]
+#
+# CAPTURE is a file written by "server.py --record PATH". The replay starts
+# the LabControlServer from DIR (default: this folder) on a free local port in
+# an empty temporary folder, then repeats the capture in order: simulated
+# clients connect, send their messages and disconnect at the recorded times,
+# and every broadcast is sent again with the same message and pacing. The
+# simulated clients acknowledge messages at once instead of opening a browser.
+#
+# --speed 1 keeps the original timing, 10 runs ten times faster and 0 sends
+# everything as fast as possible. Before each broadcast the replay waits until
+# the server has registered every connected client, so a run is repeatable.
+# Paced broadcasts keep their recorded pacing at any speed, so a client they
+# are still sending to is only disconnected once they finish; the time spent
+# waiting is reported as paced_wait_seconds.
+#
+# The server runs in this process, alongside the simulated clients, so the
+# latencies include the time the server waits for the GIL while they run.
+#
+# To compare two builds, replay the same capture against each:
+#
+#   python replay.py capture.jsonl --build ../old --output old.json
+#   python replay.py capture.jsonl --compare old.json
+#
+# This file deliberately imports nothing else from the project, so it can
+# drive older builds that lack the newer modules.
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+SYNC_TIMEOUT = 2.0  # seconds to wait for the server to see a connect or disconnect
+IDLE_TIMEOUT = 1.0  # stop waiting for stragglers after this long without traffic
+
+_decoder = json.JSONDecoder()
+
+# Results where a change is an improvement or a regression; the rest are counts
+LOWER_IS_BETTER = ("_ms.", "seconds", "missing", "unsupported")
+HIGHER_IS_BETTER = ("delivered", "per_second")
+
+
+def load_capture(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash should not stop the replay
+                continue
+
+    records.sort(key=lambda record: record.get("ts", 0))
+    return records
+
+
+def payload_key(message):
+    """Identify a broadcast by its content, ignoring the per-run id."""
+    if isinstance(message, dict):
+        message = {key: value for key, value in message.items() if key != "id"}
+    return json.dumps(message, sort_keys=True, separators=(',', ':'))
+
+
+def summarize(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "p50": round(statistics.median(values), 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+        "mean": round(statistics.mean(values), 3),
+    }
+
+
+def free_port():
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+class SimulatedClient:
+    """A client connection that logs what it receives and acks broadcasts."""
+
+    def __init__(self, key, port):
+        self.key = key
+        self.received = []  # [(perf_counter time, message)]
+        self.lock = threading.Lock()
+
+        start_time = time.perf_counter()
+        self.socket = socket.create_connection(('127.0.0.1', port))
+        self.connect_ms = (time.perf_counter() - start_time) * 1000
+
+        self.thread = threading.Thread(target=self.receive_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def receive_loop(self):
+        buffer = ''
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+
+            now = time.perf_counter()
+            buffer += data.decode('utf-8', errors='replace')
+            messages, buffer = split_messages(buffer)
+
+            for message in messages:
+                with self.lock:
+                    self.received.append((now, message))
+                if isinstance(message, dict) and message.get("id"):
+                    self.send({"action": "ack", "id": message["id"], "ok": True})
+
+    def send(self, message):
+        if isinstance(message, dict):
+            data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        else:
+            data = str(message).encode('utf-8')
+        try:
+            self.socket.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+def split_messages(buffer):
+    """Split back-to-back JSON messages; older builds send them unframed."""
+    messages = []
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position >= len(buffer):
+            return messages, ''
+        try:
+            message, position = _decoder.raw_decode(buffer, position)
+        except ValueError:
+            return messages, buffer[position:]
+        messages.append(message)
+
+
+class Replay:
+    def __init__(self, server, port, speed=1.0):
+        self.server = server
+        self.port = port
+        self.speed = speed
+        self.clients = {}  # {captured client key: SimulatedClient}
+        self.all_clients = []
+        self.broadcasts = []  # [{"key", "kind", "sent_at", "call_ms", "clients"}]
+        self.paced = []  # [(delivery, clients)] for paced broadcasts that may still be sending
+        self.paced_wait = 0.0
+        self.requests = []  # [(client, hash, sent_at)] for get_link_set round trips
+        self.unsupported = 0
+        self.skipped_acks = 0
+
+    def run(self, records):
+        if not records:
+            return
+
+        first_ts = records[0]["ts"]
+        start_time = time.perf_counter()
+
+        for record in records:
+            if self.speed > 0:
+                due = start_time + (record["ts"] - first_ts) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            event = record.get("ev")
+            if event == "connect":
+                self.connect(record["c"])
+            elif event == "disconnect":
+                self.disconnect(record["c"])
+            elif event == "message":
+                self.client_message(record["c"], record.get("msg"))
+            elif event == "broadcast":
+                self.broadcast(record)
+            elif event == "prepare":
+                self.prepare(record)
+
+    def connect(self, key):
+        if key in self.clients:
+            self.disconnect(key)
+        client = SimulatedClient(key, self.port)
+        self.clients[key] = client
+        self.all_clients.append(client)
+
+    def disconnect(self, key):
+        client = self.clients.pop(key, None)
+        if client:
+            self.wait_for_paced(client)
+            client.close()
+
+    def wait_for_paced(self, client):
+        # The waves keep their recorded pacing, so at a higher speed a
+        # disconnect could otherwise overtake the wave meant for this client
+        start_time = time.perf_counter()
+        for delivery, clients in self.paced:
+            if client in clients:
+                while not getattr(delivery, "is_done", True):
+                    time.sleep(0.001)
+        self.paced = [(delivery, clients) for delivery, clients in self.paced
+                      if not getattr(delivery, "is_done", True)]
+        self.paced_wait += time.perf_counter() - start_time
+
+    def client_message(self, key, message):
+        if isinstance(message, dict) and message.get("action") == "ack":
+            # The simulated clients send their own acks
+            self.skipped_acks += 1
+            return
+
+        if key not in self.clients:
+            # The client connected before recording started
+            self.connect(key)
+
+        client = self.clients[key]
+        if isinstance(message, dict) and message.get("action") == "get_link_set":
+            self.requests.append((client, message.get("hash"), time.perf_counter()))
+        client.send(message)
+
+    def wait_for_server(self):
+        deadline = time.time() + SYNC_TIMEOUT
+        while len(self.server.clients) != len(self.clients) and time.time() < deadline:
+            time.sleep(0.001)
+
+    def broadcast(self, record):
+        message = record["msg"]
+        urls = record.get("urls") or []
+        pacing = record.get("pacing")
+        action = message.get("action")
+
+        if action == "open_link_set" and hasattr(self.server, "link_sets"):
+            # The replay runs in an empty folder, so recreate the set
+            self.server.link_sets[message.get("name", message.get("hash"))] = urls
+            if hasattr(self.server, "index_link_sets"):
+                self.server.index_link_sets()
+
+        send = self.sender(message, urls, pacing)
+        if send is None:
+            self.unsupported += 1
+            return
+        self.send_broadcast(message, f"{action}_paced" if pacing else action, send)
+
+    def send_broadcast(self, message, kind, send):
+        self.wait_for_server()
+        clients = list(self.clients.values())
+        sent_at = time.perf_counter()
+        delivery = send()
+        call_ms = (time.perf_counter() - sent_at) * 1000
+
+        self.broadcasts.append({
+            "key": payload_key(message),
+            "kind": kind,
+            "sent_at": sent_at,
+            "call_ms": call_ms,
+            "clients": clients,
+        })
+        if kind.endswith("_paced"):
+            self.paced.append((delivery, clients))
+
+    def prepare(self, record):
+        # Sent to every client; the capture does not say which ones needed it
+        urls = record.get("urls") or []
+        message = {"action": "prepare", "urls": urls}
+        if not hasattr(self.server, "prepare_links"):
+            self.unsupported += 1
+            return
+        self.send_broadcast(message, "prepare", lambda: self.server.prepare_links(urls, force=True))
+
+    def sender(self, message, urls, pacing):
+        """Return a callable that sends message with this build, or None."""
+        server = self.server
+        if pacing:
+            if not hasattr(server, "broadcast_paced"):
+                return None
+            return lambda: server.broadcast_paced(message, urls, **pacing)
+        if hasattr(server, "broadcast"):
+            return lambda: server.broadcast(message, urls)
+
+        # Builds from before the generic broadcast() only know these two
+        action = message.get("action")
+        if action == "open_link" and hasattr(server, "broadcast_link"):
+            return lambda: server.broadcast_link(message["url"])
+        if action == "open_multiple_links" and hasattr(server, "broadcast_multiple_links"):
+            return lambda: server.broadcast_multiple_links(message["urls"])
+        return None
+
+    def expected(self):
+        return sum(len(broadcast["clients"]) for broadcast in self.broadcasts)
+
+    def delivered(self):
+        return sum(len(client.received) for client in self.all_clients)
+
+    def settle(self, timeout):
+        """Wait for outstanding messages until all arrived or traffic stops.
+
+        Older builds never answer some requests, so a quiet second ends the
+        wait early, except while paced deliveries are still sending waves.
+        """
+        deadline = time.time() + timeout
+        expected = self.expected() + len(self.requests)
+        delivered = self.delivered()
+        last_change = time.time()
+
+        while delivered < expected and time.time() < deadline:
+            time.sleep(0.01)
+            count = self.delivered()
+            if count != delivered:
+                delivered = count
+                last_change = time.time()
+            elif time.time() - last_change > IDLE_TIMEOUT and not self.pacing():
+                break
+
+    def pacing(self):
+        deliveries = getattr(self.server, "deliveries", {})
+        return any(not delivery.is_done for delivery in list(deliveries.values()))
+
+    def last_received(self):
+        times = [client.received[-1][0] for client in self.all_clients if client.received]
+        return max(times, default=None)
+
+    def results(self):
+        # The nth copy of a payload a client receives belongs to the nth
+        # broadcast of that payload the client was connected for
+        expected_by_client = {}
+        for index, broadcast in enumerate(self.broadcasts):
+            for client in broadcast["clients"]:
+                expected_by_client.setdefault(id(client), {}).setdefault(broadcast["key"], []).append(index)
+
+        latencies = []
+        latencies_by_kind = {}
+        matched = 0
+        first_sent = min((broadcast["sent_at"] for broadcast in self.broadcasts), default=None)
+        last_received = first_sent
+
+        for client in self.all_clients:
+            pending = expected_by_client.get(id(client), {})
+            with client.lock:
+                received = list(client.received)
+            for received_at, message in received:
+                indexes = pending.get(payload_key(message))
+                if not indexes:
+                    continue
+                broadcast = self.broadcasts[indexes.pop(0)]
+                latency = (received_at - broadcast["sent_at"]) * 1000
+                latencies.append(latency)
+                latencies_by_kind.setdefault(broadcast["kind"], []).append(latency)
+                matched += 1
+                last_received = max(last_received, received_at)
+
+        request_latencies = []
+        for client, set_hash, sent_at in self.requests:
+            with client.lock:
+                received = list(client.received)
+            for received_at, message in received:
+                if (received_at >= sent_at and isinstance(message, dict)
+                        and message.get("action") == "link_set" and message.get("hash") == set_hash):
+                    request_latencies.append((received_at - sent_at) * 1000)
+                    break
+
+        span = (last_received - first_sent) if first_sent is not None else 0
+        expected = self.expected()
+        return {
+            "clients": len(self.all_clients),
+            "broadcasts": len(self.broadcasts),
+            "unsupported": self.unsupported,
+            "expected": expected,
+            "delivered": matched,
+            "missing": expected - matched,
+            "latency_ms": summarize(latencies),
+            # Compare builds here when one of them skips some kinds
+            "latency_by_kind_ms": {kind: summarize(values) for kind, values in sorted(latencies_by_kind.items())},
+            "broadcast_call_ms": summarize([broadcast["call_ms"] for broadcast in self.broadcasts]),
+            "connect_ms": summarize([client.connect_ms for client in self.all_clients]),
+            "request_ms": summarize(request_latencies),
+            "deliveries_per_second": round(matched / span, 1) if span > 0 else None,
+            "paced_wait_seconds": round(self.paced_wait, 3),
+        }
+
+    def close(self):
+        for client in self.all_clients:
+            client.close()
+
+
+def load_build(build_dir):
+    if build_dir:
+        sys.path.insert(0, os.path.abspath(build_dir))
+    import server
+    return server
+
+
+def flatten(results, prefix=""):
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def print_comparison(old, new):
+    if old.get("speed") != new.get("speed"):
+        print(f"\nWarning: the baseline ran at speed {old.get('speed')}, this run at {new.get('speed')}")
+
+    old_values = flatten(old)
+    new_values = flatten(new)
+    old_values.pop("speed", None)
+    width = max(len(name) for name in new_values) + 2
+    print(f"\n{'':<{width}}{'baseline':>12}{'this run':>12}{'change':>10}")
+    for name in new_values:
+        if name not in old_values:
+            continue
+        before = old_values[name]
+        after = new_values[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+        better = ""
+        if before != after:
+            if any(word in name for word in LOWER_IS_BETTER):
+                better = " better" if after < before else " worse"
+            elif any(word in name for word in HIGHER_IS_BETTER):
+                better = " better" if after > before else " worse"
+        print(f"{name:<{width}}{before:>12}{after:>12}{change:>10}{better}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded server traffic and measure a build")
+    parser.add_argument("capture", help="Capture file written by server.py --record")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed: 1 is the original timing, 0 is as fast as possible")
+    parser.add_argument("--build", metavar="DIR", help="Folder with the server.py to test (default: this folder)")
+    parser.add_argument("--output", metavar="PATH", help="Write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Results JSON of an earlier run to compare with")
+    parser.add_argument("--settle", type=float, default=10.0,
+                        help="Seconds to wait for outstanding deliveries at the end")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    server_module = load_build(args.build)
+
+    # Start from an empty folder so saved links and journals do not leak in
+    work_dir = tempfile.mkdtemp(prefix="linkopener-replay-")
+    os.chdir(work_dir)
+
+    port = free_port()
+    server = server_module.LabControlServer('127.0.0.1', port)
+    for name in ("journal", "recorder"):
+        if getattr(server, name, None) is not None:
+            setattr(server, name, None)
+    server.log_message = lambda message: None
+    server.start_server()
+
+    print(f"Replaying {len(records)} events from {args.capture} "
+          f"at {'full' if args.speed <= 0 else f'{args.speed:g}x'} speed "
+          f"against {os.path.abspath(args.build or os.path.dirname(os.path.abspath(__file__)))}")
+
+    replay = Replay(server, port, args.speed)
+    start_time = time.perf_counter()
+    try:
+        replay.run(records)
+        end_time = time.perf_counter()
+        replay.settle(args.settle)
+        results = replay.results()
+        # Time until the last event was sent or the last message arrived
+        end_time = max(end_time, replay.last_received() or end_time)
+    finally:
+        replay.close()
+        server.stop_server()
+    results["wall_seconds"] = round(end_time - start_time, 3)
+    results["speed"] = args.speed
+
+    print(json.dumps(results, indent=2))
+    if replay.skipped_acks:
+        print(f"({replay.skipped_acks} recorded acks were replaced by the simulated clients' own)")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+    if compare:
+        with open(compare, 'r') as f:
+            print_comparison(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,59 @@
 
 import socket
 import threading
+import subprocess
+import argparse
+import signal
+import sys
+import time
+from urllib.parse import urlparse
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import json
 import os
+import selectors
+import uuid
+import queue
+import datetime
+
+from journal import EventJournal
+from protocol import MessageReader, encode_message
+from linksets import link_set_hash
+from waves import WaveDelivery
+from linkindex import LinkIndex
+import handoff
+
+POLL_INTERVAL = 0.25  # seconds between checks of the listening socket while accepting
+# poll() has no FD_SETSIZE limit; Windows select() does not limit fd values
+SELECTOR = getattr(selectors, 'PollSelector', selectors.SelectSelector)
 
 class LabControlServer:
-    def __init__(self, host='0.0.0.0', port=9999):
+    def __init__(self, host='0.0.0.0', port=9999, journal_path='journal/journal.jsonl', record_path=None):
         self.host = host
         self.port = port
         self.server_socket = None
         self.clients = {}  # {address: socket}
+        self.client_threads = {}  # {address: thread reading that client}
+        self.send_locks = {}  # {address: lock held while a message is sent to that client}
         self.is_running = False
+        self.handing_off = False  # Set while sockets are passed to a new process
+        self.pending_input = {}  # {address: bytes read but not yet handled} after pausing
+        # Every waiting thread also watches wakeup_reader; one byte written
+        # to it wakes them all to check is_running and handing_off
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
         self.saved_links = self.load_saved_links()
+        self.link_sets = self.load_link_sets()  # {name: [urls]}
+        self.link_sets_by_hash = {}  # {hash: urls}
+        self.index_link_sets()
+        self.journal = EventJournal(journal_path) if journal_path else None
+        # Full timed traffic capture for replay.py, written without rotation
+        self.recorder = EventJournal(record_path, max_bytes=0) if record_path else None
+        self.last_broadcast_id = None
+        self.deliveries = {}  # {broadcast_id: WaveDelivery}
+        self.client_groups = self.load_client_groups()  # {ip: group name}
+        self.prepared_hosts = {}  # {host: (time clients were last asked to resolve it, {addresses asked})}
+        self.prepare_interval = 60  # seconds before the same host is prepared again
         
     def load_saved_links(self):
         try:
@@ -33,26 +73,278 @@ class LabControlServer:
         except Exception as e:
             print(f"Error saving links: {e}")
     
+    def load_client_groups(self):
+        try:
+            if os.path.exists('client_groups.json'):
+                with open('client_groups.json', 'r') as f:
+                    return json.load(f)
+            return {}
+        except Exception as e:
+            print(f"Error loading client groups: {e}")
+            return {}
+    
+    def load_link_sets(self):
+        try:
+            if os.path.exists('link_sets.json'):
+                with open('link_sets.json', 'r') as f:
+                    return json.load(f)
+            return {}
+        except Exception as e:
+            print(f"Error loading link sets: {e}")
+            return {}
+    
+    def save_link_sets(self):
+        try:
+            with open('link_sets.json', 'w') as f:
+                json.dump(self.link_sets, f)
+        except Exception as e:
+            print(f"Error saving link sets: {e}")
+        self.index_link_sets()
+    
+    def index_link_sets(self):
+        self.link_sets_by_hash = {link_set_hash(urls): urls for urls in self.link_sets.values()}
+    
+    def create_link_set(self, name, link_names):
+        # Snapshot the URLs so later edits to saved links give a new hash
+        urls = [self.saved_links[link_name] for link_name in link_names if link_name in self.saved_links]
+        self.link_sets[name] = urls
+        self.save_link_sets()
+        return link_set_hash(urls)
+    
+    def delete_link_set(self, name):
+        if name in self.link_sets:
+            del self.link_sets[name]
+            self.save_link_sets()
+    
     def start_server(self):
         if self.is_running:
             return
             
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(100)  # Allow up to 100 queued connections
+        self.server_socket = self.create_server_socket(self.host, self.port)
+        
+        self.open_logs()
         
+        self.clear_wakeup()
         self.is_running = True
+        self.start_accept_thread()
+        return f"Server started on {self.host}:{self.port}"
+    
+    def create_server_socket(self, host, port):
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server_socket.bind((host, port))
+            server_socket.listen(100)  # Allow up to 100 queued connections
+        except:
+            server_socket.close()
+            raise
+        return server_socket
+    
+    def start_accept_thread(self):
         self.accept_thread = threading.Thread(target=self.accept_connections)
         self.accept_thread.daemon = True
         self.accept_thread.start()
-        return f"Server started on {self.host}:{self.port}"
+    
+    def start_client_thread(self, client_socket, client_address, pending=b''):
+        client_thread = threading.Thread(
+            target=self.handle_client, 
+            args=(client_socket, client_address, pending)
+        )
+        client_thread.daemon = True
+        self.client_threads[client_address] = client_thread
+        client_thread.start()
+    
+    def pause_reading(self):
+        """Stop the accept and client threads without closing any socket.
+        
+        The client threads keep any partial message in pending_input, so
+        nothing a client sends is lost.
+        """
+        self.handing_off = True
+        self.wake_threads()
+        self.accept_thread.join()
+        for client_thread in list(self.client_threads.values()):
+            client_thread.join()
+    
+    def resume_reading(self):
+        self.clear_wakeup()
+        self.handing_off = False
+        self.start_accept_thread()
+        for address, client_socket in list(self.clients.items()):
+            self.start_client_thread(client_socket, address, self.pending_input.pop(address, b''))
+    
+    def wake_threads(self):
+        # The byte is never read by the waiting threads, so it wakes all of them
+        try:
+            self.wakeup_writer.send(b'x')
+        except OSError:
+            pass
+    
+    def clear_wakeup(self):
+        try:
+            while self.wakeup_reader.recv(4096):
+                pass
+        except OSError:
+            pass
+    
+    def reconfigure(self, host, port):
+        """Apply new settings while keeping every client connected."""
+        if not self.is_running or (host, port) == (self.host, self.port):
+            self.host = host
+            self.port = port
+            return f"Server will use {host}:{port}"
+        
+        old_socket = self.server_socket
+        try:
+            new_socket = self.create_server_socket(host, port)
+        except OSError:
+            if port != self.port:
+                raise
+            # Same port on another address can conflict with the old
+            # listener, so release it first; clients retry the short gap
+            self.close_listening_socket(old_socket)
+            old_socket = None
+            try:
+                new_socket = self.create_server_socket(host, port)
+            except OSError:
+                self.restore_listening_socket()
+                raise
+        
+        # The accept thread picks up the new socket on its next iteration
+        self.server_socket = new_socket
+        self.host = host
+        self.port = port
+        if old_socket:
+            self.close_listening_socket(old_socket)
+        
+        self.record_event("reconfigure", host=host, port=port)
+        return f"Server now listening on {host}:{port} ({len(self.clients)} clients kept)"
+    
+    def restore_listening_socket(self):
+        # The new address failed after the old listener was released
+        try:
+            self.server_socket = self.create_server_socket(self.host, self.port)
+        except OSError as e:
+            self.log_message(f"Could not listen on {self.host}:{self.port} again: {e}")
+            self.stop_server()
+    
+    def close_listening_socket(self, listening_socket):
+        # shutdown() wakes a thread blocked in accept(); close() alone does not
+        try:
+            listening_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            listening_socket.close()
+        except:
+            pass
+    
+    def hand_off(self, extra_args=()):
+        """Start a new server process and give it every socket.
+        
+        Used to restart or upgrade the server without disconnecting anyone.
+        On success this server is stopped and the caller should exit.
+        """
+        if not handoff.is_supported():
+            raise RuntimeError("Restarting without disconnecting is only supported on Linux")
+        if not self.is_running:
+            raise RuntimeError("Server is not running")
+        if any(not delivery.is_done for delivery in self.deliveries.values()):
+            # The new process could not continue the remaining waves
+            raise RuntimeError("A paced delivery is still running; wait for it or cancel it first")
+        
+        path = handoff.handoff_path()
+        listener = handoff.create_handoff_listener(path)
+        process = None
+        start_time = time.time()
+        try:
+            command = self.successor_command(path) + list(extra_args)
+            if self.recorder:
+                # Keep recording in the same capture after the restart
+                command += ['--record', self.recorder.path]
+            process = subprocess.Popen(command)
+            
+            # Stop reading before the successor starts, or this process
+            # could take messages and connections that then go unanswered
+            self.pause_reading()
+            clients = list(self.clients.items())
+            pending = {
+                f"{address[0]}:{address[1]}": self.pending_input[address]
+                for address, _ in clients if self.pending_input.get(address)
+            }
+            handoff.send_sockets(
+                listener, 
+                self.server_socket, 
+                [client_socket for _, client_socket in clients], 
+                {"host": self.host, "port": self.port}, 
+                pending
+            )
+        except:
+            if process and process.poll() is None:
+                process.kill()
+            if self.handing_off:
+                self.resume_reading()
+            raise
+        finally:
+            listener.close()
+            if os.path.exists(path):
+                os.remove(path)
+        
+        elapsed = (time.time() - start_time) * 1000
+        self.record_event("handoff", pid=process.pid, clients=len(clients))
+        
+        # The successor holds its own references now, so closing ours
+        # does not end any connection
+        self.stop_server()
+        return f"Handed {len(clients)} clients to process {process.pid} in {elapsed:.0f} ms"
+    
+    def successor_command(self, path):
+        if getattr(sys, 'frozen', False):
+            command = [sys.executable]
+        else:
+            command = [sys.executable, os.path.abspath(__file__)]
+        return command + ['--takeover', path]
+    
+    def take_over(self, path):
+        """Adopt the sockets of the server process that started this one."""
+        conn, listen_socket, client_sockets, state = handoff.receive_sockets(path)
+        try:
+            self.host = state["host"]
+            self.port = state["port"]
+            self.server_socket = listen_socket
+            pending = state["pending"]
+            
+            for client_socket in client_sockets:
+                try:
+                    address = client_socket.getpeername()
+                except OSError:
+                    # Disconnected during the hand-off
+                    client_socket.close()
+                    continue
+                self.clients[address] = client_socket
+            
+            self.open_logs()
+            
+            self.is_running = True
+            self.start_accept_thread()
+            for address, client_socket in list(self.clients.items()):
+                # Partial messages the old process had already read
+                self.start_client_thread(client_socket, address, pending.get(f"{address[0]}:{address[1]}", b''))
+            
+            conn.send(b"ready")
+        finally:
+            conn.close()
+        
+        self.record_event("takeover", host=self.host, port=self.port, clients=len(self.clients))
+        return f"Took over {self.host}:{self.port} with {len(self.clients)} connected clients"
     
     def stop_server(self):
         if not self.is_running:
             return
             
         self.is_running = False
+        # close() does not wake a thread waiting on a socket
+        self.wake_threads()
         
         # Close all client connections
         for client_socket in list(self.clients.values()):
@@ -62,6 +354,7 @@ class LabControlServer:
                 pass
         
         self.clients.clear()
+        self.send_locks.clear()
         
         # Close server socket
         if self.server_socket:
@@ -73,94 +366,340 @@ class LabControlServer:
         return "Server stopped"
     
     def accept_connections(self):
-        while self.is_running:
+        while self.is_running and not self.handing_off:
+            listening_socket = self.server_socket
             try:
-                client_socket, client_address = self.server_socket.accept()
-                self.clients[client_address] = client_socket
-                
-                # Start a thread to handle this client
-                client_thread = threading.Thread(
-                    target=self.handle_client, 
-                    args=(client_socket, client_address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
-                
-                self.log_message(f"New connection from {client_address[0]}:{client_address[1]}")
-            except:
-                if self.is_running:
+                # The timeout picks up a socket swapped by reconfigure()
+                with SELECTOR() as selector:
+                    selector.register(listening_socket, selectors.EVENT_READ)
+                    selector.register(self.wakeup_reader, selectors.EVENT_READ)
+                    ready = selector.select(POLL_INTERVAL)
+                if not any(key.fileobj is listening_socket for key, _ in ready):
                     continue
-                break
+                client_socket, client_address = listening_socket.accept()
+            except (OSError, ValueError) as e:
+                # ValueError: a closed socket cannot be registered
+                if not self.is_running:
+                    break
+                if listening_socket is self.server_socket and listening_socket.fileno() == -1:
+                    # reconfigure() may be about to replace it; if not,
+                    # accept() would fail forever
+                    time.sleep(POLL_INTERVAL)
+                    if listening_socket is self.server_socket:
+                        self.log_message("Stopped accepting connections: the listening socket was closed")
+                        break
+                elif listening_socket is self.server_socket:
+                    self.log_message(f"Error accepting a connection: {e}")
+                    time.sleep(POLL_INTERVAL)
+                continue
+            
+            self.clients[client_address] = client_socket
+            
+            # Record the connect before the client thread can record messages
+            self.record_event("connect", ip=client_address[0], port=client_address[1])
+            self.record_traffic("connect", c=f"{client_address[0]}:{client_address[1]}")
+            
+            # Start a thread to handle this client
+            self.start_client_thread(client_socket, client_address)
+            self.log_message(f"New connection from {client_address[0]}:{client_address[1]}")
     
-    def handle_client(self, client_socket, address):
-        while self.is_running:
-            try:
-                # Just keep the connection alive, no need to receive data
+    def handle_client(self, client_socket, address, pending=b''):
+        reader = MessageReader()
+        self.handle_client_data(client_socket, address, reader, pending)
+        
+        selector = SELECTOR()
+        try:
+            selector.register(client_socket, selectors.EVENT_READ)
+            selector.register(self.wakeup_reader, selectors.EVENT_READ)
+            
+            while self.is_running:
+                if self.handing_off:
+                    # The next process reads this client from here on
+                    self.pending_input[address] = reader.pending()
+                    self.client_threads.pop(address, None)
+                    return
+                
+                # Sleeps until the client sends something or wake_threads()
+                ready = selector.select()
+                if not any(key.fileobj is client_socket for key, _ in ready):
+                    continue
                 data = client_socket.recv(1024)
                 if not data:
                     break
-                
-                # Process any incoming messages from clients if needed
-                message = data.decode('utf-8')
-                self.log_message(f"Message from {address[0]}: {message}")
-                
-            except:
-                break
+                self.handle_client_data(client_socket, address, reader, data)
+        except (OSError, ValueError):
+            # Connection reset, or the socket was closed by stop_server()
+            pass
+        finally:
+            selector.close()
+        
+        self.client_threads.pop(address, None)
+        self.send_locks.pop(address, None)
         
         # Remove disconnected client
         if address in self.clients:
             del self.clients[address]
+            self.record_event("disconnect", ip=address[0], port=address[1])
+            self.record_traffic("disconnect", c=f"{address[0]}:{address[1]}")
             self.log_message(f"Client {address[0]} disconnected")
     
-    def broadcast_link(self, url):
+    def handle_client_data(self, client_socket, address, reader, data):
+        for message in reader.feed(data):
+            try:
+                self.handle_client_message(client_socket, address, message)
+            except Exception as e:
+                self.log_message(f"Error handling message from {address[0]}: {e}")
+    
+    def handle_client_message(self, client_socket, address, message):
+        self.record_traffic("message", c=f"{address[0]}:{address[1]}", msg=message)
+        
+        if not isinstance(message, dict):
+            self.record_event("message", ip=address[0], port=address[1], text=message)
+            self.log_message(f"Message from {address[0]}: {message}")
+            return
+        
+        action = message.get('action')
+        
+        if action == 'ack':
+            self.handle_ack(address, message)
+            return
+        
+        self.record_event("message", ip=address[0], port=address[1], msg=message)
+        
+        if action == 'get_link_set':
+            self.send_link_set(client_socket, address, message.get('hash'))
+        else:
+            self.log_message(f"Message from {address[0]}: {message}")
+    
+    def handle_ack(self, address, message):
+        # Clients confirm each broadcast once they have opened it
+        broadcast_id = message.get('id')
+        ok = bool(message.get('ok', True))
+        fields = {"id": broadcast_id, "ip": address[0], "port": address[1], "ok": int(ok)}
+        if message.get('error'):
+            fields["error"] = message['error']
+        self.record_event("ack", **fields)
+        
+        delivery = self.deliveries.get(broadcast_id)
+        if delivery:
+            delivery.on_ack(ok)
+    
+    def send_link_set(self, client_socket, address, set_hash):
+        urls = self.link_sets_by_hash.get(set_hash)
+        if urls is None:
+            self.log_message(f"Client {address[0]} asked for unknown link set {set_hash}")
+            return
+        
+        try:
+            self.send_data(address, client_socket, encode_message({"action": "link_set", "hash": set_hash, "urls": urls}))
+        except Exception as e:
+            self.log_message(f"Error sending link set to {address[0]}: {e}")
+    
+    def link_message(self, url):
+        return {"action": "open_link", "url": url}
+    
+    def multiple_links_message(self, urls):
+        return {"action": "open_multiple_links", "urls": urls}
+    
+    def link_set_message(self, name):
+        # Only the hash goes out; clients fetch the list on a cache miss
+        return {"action": "open_link_set", "hash": link_set_hash(self.link_sets[name]), "name": name}
+    
+    def prepare_message(self, urls):
+        return {"action": "prepare", "urls": urls}
+    
+    def prepare_links(self, urls, force=False):
+        """Ask clients to resolve the hosts in urls before they are opened.
+        
+        Within prepare_interval seconds of preparing a host, only clients
+        that connected since are asked again, unless force is set. Prepares
+        are not broadcasts: they get no id and are journaled as a single
+        "prepare" event. Returns (successful, failed), or None if there was
+        nothing new to prepare.
+        """
+        now = time.time()
+        clients = list(self.clients.items())
+        fresh_urls = []
+        targets = set()
+        seen_hosts = set()
+        for url in urls:
+            host = urlparse(url).hostname
+            if not host or host in seen_hosts:
+                continue
+            seen_hosts.add(host)
+            
+            prepared_at, prepared_clients = self.prepared_hosts.get(host, (0, set()))
+            if force or now - prepared_at >= self.prepare_interval:
+                missing = [address for address, _ in clients]
+                self.prepared_hosts[host] = (now, set(missing))
+            else:
+                missing = [address for address, _ in clients if address not in prepared_clients]
+                prepared_clients.update(missing)
+            
+            if missing:
+                fresh_urls.append(url)
+                targets.update(missing)
+        
+        if not fresh_urls:
+            return None
+        
         successful = 0
         failed = 0
-        
-        for address, client_socket in list(self.clients.items()):
+        data = encode_message(self.prepare_message(fresh_urls))
+        for address, client_socket in clients:
+            if address not in targets:
+                continue
             try:
-                message = json.dumps({"action": "open_link", "url": url})
-                client_socket.send(message.encode('utf-8'))
+                self.send_data(address, client_socket, data)
                 successful += 1
             except:
                 failed += 1
                 # Remove broken connection
-                del self.clients[address]
+                self.clients.pop(address, None)
         
+        self.record_event("prepare", urls=fresh_urls, clients=successful, failed=failed)
+        self.record_traffic("prepare", urls=fresh_urls)
         return successful, failed
     
+    def broadcast_link(self, url):
+        return self.broadcast(self.link_message(url), [url])
+    
     def broadcast_multiple_links(self, urls):
+        return self.broadcast(self.multiple_links_message(urls), urls)
+    
+    def broadcast_link_set(self, name):
+        return self.broadcast(self.link_set_message(name), self.link_sets[name])
+    
+    def broadcast(self, message, urls):
+        broadcast_id = self.begin_broadcast(message["action"], urls)
+        self.record_traffic("broadcast", id=broadcast_id, msg=message, urls=urls)
+        return self.send_to_all(broadcast_id, message)
+    
+    def broadcast_paced(self, message, urls, wave_size=20, rate=None, spread=None, by_group=False):
+        """Send message in waves on a background thread.
+        
+        rate is in clients per second, spread is the total time in seconds
+        to spread delivery over. Returns the WaveDelivery so callers can
+        follow its progress or cancel it.
+        """
+        broadcast_id = self.begin_broadcast(message["action"], urls)
+        self.record_traffic(
+            "broadcast", 
+            id=broadcast_id, 
+            msg=message, 
+            urls=urls, 
+            pacing={"wave_size": wave_size, "rate": rate, "spread": spread, "by_group": by_group}
+        )
+        
+        targets = list(self.clients.items())
+        if by_group:
+            targets.sort(key=lambda target: (self.client_group(target[0][0]), target[0]))
+        
+        delivery = WaveDelivery(self, broadcast_id, message, targets, wave_size, rate, spread)
+        
+        # Keep recent deliveries around for late acks
+        self.deliveries[broadcast_id] = delivery
+        while len(self.deliveries) > 20:
+            del self.deliveries[next(iter(self.deliveries))]
+        
+        delivery.start()
+        return delivery
+    
+    def client_group(self, ip):
+        # Explicit groups from client_groups.json, otherwise the /24 subnet
+        return self.client_groups.get(ip) or '.'.join(ip.split('.')[:3])
+    
+    def send_to_all(self, broadcast_id, message):
         successful = 0
         failed = 0
         
+        data = encode_message(dict(message, id=broadcast_id))
         for address, client_socket in list(self.clients.items()):
-            try:
-                message = json.dumps({"action": "open_multiple_links", "urls": urls})
-                client_socket.send(message.encode('utf-8'))
+            if self.send_to_client(broadcast_id, address, client_socket, data):
                 successful += 1
-            except:
+            else:
                 failed += 1
-                # Remove broken connection
-                del self.clients[address]
         
         return successful, failed
     
+    def send_to_client(self, broadcast_id, address, client_socket, data):
+        try:
+            self.send_data(address, client_socket, data)
+            self.record_event("deliver", id=broadcast_id, ip=address[0], port=address[1], ok=1)
+            return True
+        except:
+            self.record_event("deliver", id=broadcast_id, ip=address[0], port=address[1], ok=0)
+            # Remove broken connection
+            self.clients.pop(address, None)
+            return False
+    
+    def send_data(self, address, client_socket, data):
+        """Send data to one client; every outgoing message goes through here.
+        
+        The client's receive thread, the GUI and paced deliveries all send,
+        and a lock per client keeps one message's bytes from being split by
+        another's when the client is slow to read.
+        """
+        lock = self.send_locks.get(address)
+        if lock is None:
+            lock = self.send_locks.setdefault(address, threading.Lock())
+        with lock:
+            client_socket.sendall(data)
+    
+    def begin_broadcast(self, action, urls):
+        # Short random id so a broadcast can be looked up in the journal later
+        broadcast_id = uuid.uuid4().hex[:10]
+        self.last_broadcast_id = broadcast_id
+        self.record_event("broadcast", id=broadcast_id, action=action, urls=urls)
+        return broadcast_id
+    
+    def record_event(self, event, **fields):
+        if self.journal:
+            self.journal.record(event, **fields)
+    
+    def record_traffic(self, event, **fields):
+        if self.recorder:
+            self.recorder.record(event, **fields)
+    
+    def open_logs(self):
+        if self.journal:
+            self.journal.start()
+        if self.recorder:
+            self.recorder.start()
+    
+    def close_logs(self):
+        # Flushes whatever the background writers still have queued
+        if self.journal:
+            self.journal.close()
+        if self.recorder:
+            self.recorder.close()
+    
     def log_message(self, message):
         # This will be overridden by the GUI to display logs
         print(message)
 
 
 class ServerGUI:
-    def __init__(self, root):
+    def __init__(self, root, server=None):
         self.root = root
         self.root.title("Lab Control Server")
         self.root.geometry("800x600")
         
-        self.server = LabControlServer()
+        self.server = server or LabControlServer()
+        
+        # Log lines arrive from the accept and client threads, so they are
+        # queued and written to the widget from the Tk main loop
+        self.log_queue = queue.Queue()
         
         # Override the log_message method
         self.server.log_message = self.log_message
         
         self.create_widgets()
+        self.process_log_queue()
+        
+        # A server taken over from a previous process is already running
+        if self.server.is_running:
+            self.status_label.config(text="Server Status: Running")
     
     def create_widgets(self):
         # Create a notebook (tabbed interface)
@@ -223,6 +762,9 @@ class ServerGUI:
         self.send_button = ttk.Button(link_input_frame, text="Open on All Computers", command=self.send_link)
         self.send_button.pack(side=tk.LEFT, padx=5)
         
+        self.prepare_button = ttk.Button(link_input_frame, text="Prepare", command=self.prepare_link)
+        self.prepare_button.pack(side=tk.LEFT, padx=5)
+        
         self.save_link_button = ttk.Button(link_input_frame, text="Save Link", command=self.save_current_link)
         self.save_link_button.pack(side=tk.LEFT, padx=5)
         
@@ -245,6 +787,63 @@ class ServerGUI:
         )
         self.send_multiple_button.pack(side=tk.LEFT, padx=5)
         
+        self.prepare_multiple_button = ttk.Button(
+            multiple_links_btn_frame, 
+            text="Prepare All Links", 
+            command=self.prepare_multiple_links
+        )
+        self.prepare_multiple_button.pack(side=tk.LEFT, padx=5)
+        
+        # Paced delivery section
+        delivery_frame = ttk.LabelFrame(self.control_frame, text="Delivery")
+        delivery_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        delivery_options_frame = ttk.Frame(delivery_frame)
+        delivery_options_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.paced_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(delivery_options_frame, text="Send in waves", variable=self.paced_var).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(delivery_options_frame, text="Wave size:").pack(side=tk.LEFT, padx=5)
+        self.wave_size_spinbox = ttk.Spinbox(delivery_options_frame, from_=1, to=1000, width=5)
+        self.wave_size_spinbox.set(20)
+        self.wave_size_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(delivery_options_frame, text="Pace:").pack(side=tk.LEFT, padx=5)
+        self.pace_entry = ttk.Entry(delivery_options_frame, width=6)
+        self.pace_entry.insert(0, "50")
+        self.pace_entry.pack(side=tk.LEFT, padx=5)
+        
+        self.pace_mode_combo = ttk.Combobox(
+            delivery_options_frame, 
+            values=("clients per second", "seconds in total"), 
+            width=18, 
+            state="readonly"
+        )
+        self.pace_mode_combo.set("clients per second")
+        self.pace_mode_combo.pack(side=tk.LEFT, padx=5)
+        
+        self.by_group_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(delivery_options_frame, text="Order by group", variable=self.by_group_var).pack(side=tk.LEFT, padx=5)
+        
+        delivery_progress_frame = ttk.Frame(delivery_frame)
+        delivery_progress_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.delivery_progress = ttk.Progressbar(delivery_progress_frame, length=200, mode="determinate")
+        self.delivery_progress.pack(side=tk.LEFT, padx=5)
+        
+        self.delivery_label = ttk.Label(delivery_progress_frame, text="No delivery in progress")
+        self.delivery_label.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        
+        self.cancel_delivery_button = ttk.Button(
+            delivery_progress_frame, 
+            text="Cancel", 
+            command=self.cancel_delivery
+        )
+        self.cancel_delivery_button.pack(side=tk.RIGHT, padx=5)
+        self.active_delivery = None
+        self.delivery_polling = False
+        
         # Log section
         log_frame = ttk.LabelFrame(self.control_frame, text="Server Log")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -272,6 +871,28 @@ class ServerGUI:
         self.add_link_button = ttk.Button(controls_frame, text="Add Link", command=self.add_saved_link)
         self.add_link_button.pack(side=tk.LEFT, padx=5)
         
+        # Search box
+        search_frame = ttk.Frame(self.saved_links_frame)
+        search_frame.pack(fill=tk.X, padx=10)
+        
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.link_search_var = tk.StringVar()
+        self.link_search_entry = ttk.Entry(search_frame, textvariable=self.link_search_var, width=40)
+        self.link_search_entry.pack(side=tk.LEFT, padx=5)
+        self.link_search_var.trace_add("write", lambda *args: self.search_saved_links())
+        
+        self.link_count_label = ttk.Label(search_frame, text="")
+        self.link_count_label.pack(side=tk.RIGHT, padx=5)
+        
+        # The index answers searches; the treeview only ever holds the rows
+        # that fit on screen and is re-filled as the list scrolls
+        self.link_index = LinkIndex(self.server.saved_links)
+        self.link_results = []  # names matching the search, in display order
+        self.link_offset = 0  # position of the first visible row in link_results
+        self.visible_link_rows = 20
+        self.selected_link_names = {}  # {name: None}, kept across scrolling
+        self.link_click_extends = False
+        
         # Create a frame for the treeview
         tree_frame = ttk.Frame(self.saved_links_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -291,10 +912,17 @@ class ServerGUI:
         
         self.links_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        # Add a scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.links_tree.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.links_tree.configure(yscrollcommand=scrollbar.set)
+        # Add a scrollbar that scrolls through the search results
+        self.links_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.scroll_saved_links)
+        self.links_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.links_tree.bind("<Configure>", self.on_links_tree_resize)
+        self.links_tree.bind("<MouseWheel>", self.on_links_mousewheel)
+        self.links_tree.bind("<Button-4>", self.on_links_mousewheel)
+        self.links_tree.bind("<Button-5>", self.on_links_mousewheel)
+        self.links_tree.bind("<Button-1>", self.on_links_click, add="+")
+        self.links_tree.bind("<Up>", lambda event: self.on_links_arrow_key(-1))
+        self.links_tree.bind("<Down>", lambda event: self.on_links_arrow_key(1))
         
         # Add buttons for actions
         button_frame = ttk.Frame(self.saved_links_frame)
@@ -314,8 +942,51 @@ class ServerGUI:
         )
         self.delete_link_button.pack(side=tk.LEFT, padx=5)
         
+        # Warm up clients for the link the teacher is about to open
+        self.auto_prepare_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            button_frame, 
+            text="Prepare clients when a link is selected", 
+            variable=self.auto_prepare_var
+        ).pack(side=tk.LEFT, padx=20)
+        self.auto_prepare_job = None
+        self.links_tree.bind("<<TreeviewSelect>>", self.on_links_tree_select)
+        
+        # Link sets section
+        link_sets_frame = ttk.LabelFrame(self.saved_links_frame, text="Link Sets")
+        link_sets_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        link_sets_inner_frame = ttk.Frame(link_sets_frame)
+        link_sets_inner_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.save_link_set_button = ttk.Button(
+            link_sets_inner_frame, 
+            text="Save Selection as Set", 
+            command=self.save_selection_as_link_set
+        )
+        self.save_link_set_button.pack(side=tk.LEFT, padx=5)
+        
+        self.link_set_combo = ttk.Combobox(link_sets_inner_frame, width=25, state="readonly")
+        self.link_set_combo.pack(side=tk.LEFT, padx=5)
+        self.link_set_combo.bind("<<ComboboxSelected>>", self.on_link_set_selected)
+        
+        self.open_link_set_button = ttk.Button(
+            link_sets_inner_frame, 
+            text="Open Link Set", 
+            command=self.open_link_set
+        )
+        self.open_link_set_button.pack(side=tk.LEFT, padx=5)
+        
+        self.delete_link_set_button = ttk.Button(
+            link_sets_inner_frame, 
+            text="Delete Link Set", 
+            command=self.delete_link_set
+        )
+        self.delete_link_set_button.pack(side=tk.LEFT, padx=5)
+        
         # Load saved links
         self.refresh_saved_links()
+        self.refresh_link_sets()
     
     def setup_settings_panel(self):
         # Network settings section
@@ -342,6 +1013,15 @@ class ServerGUI:
         )
         self.save_settings_button.pack(side=tk.LEFT, padx=20)
         
+        self.restart_button = ttk.Button(
+            host_frame, 
+            text="Restart Without Disconnecting", 
+            command=self.restart_server
+        )
+        self.restart_button.pack(side=tk.LEFT, padx=5)
+        if not handoff.is_supported():
+            self.restart_button.config(state=tk.DISABLED)
+        
         # Help section
         help_frame = ttk.LabelFrame(self.settings_frame, text="Setup Instructions")
         help_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -357,7 +1037,8 @@ class ServerGUI:
    - Note the IP address and port in the settings tab
    
 2. Client Setup (Student Computers):
-   - Copy the client.py file to all student computers
+   - Copy client.py, protocol.py and linksets.py into one folder
+     on all student computers
    - Create a shortcut to run it on startup with the correct server IP:
      Python client.py <your_server_ip> <port>
    - Or create a batch file (.bat) with this command to run on startup
@@ -408,11 +1089,81 @@ class ServerGUI:
             self.url_entry.insert(0, url)
         
         try:
-            successful, failed = self.server.broadcast_link(url)
-            self.log_message(f"Link sent to {successful} clients ({failed} failed)")
+            self.deliver("Link", self.server.link_message(url), [url])
         except Exception as e:
             self.log_message(f"Error sending link: {e}")
     
+    def deliver(self, description, message, urls):
+        # Send to every client now, or in waves when paced delivery is on
+        if not self.paced_var.get():
+            successful, failed = self.server.broadcast(message, urls)
+            self.log_message(f"{description} sent to {successful} clients ({failed} failed) [broadcast {self.server.last_broadcast_id}]")
+            return
+        
+        if self.active_delivery and not self.active_delivery.is_done:
+            # Progress and Cancel follow one delivery at a time
+            raise RuntimeError(
+                f"broadcast {self.active_delivery.broadcast_id} is still being sent in waves; "
+                f"wait for it or cancel it first"
+            )
+        
+        wave_size = int(self.wave_size_spinbox.get())
+        pace = float(self.pace_entry.get())
+        if pace <= 0:
+            raise ValueError("pace must be greater than zero")
+        if self.pace_mode_combo.get() == "seconds in total":
+            pacing = {"spread": pace}
+        else:
+            pacing = {"rate": pace}
+        
+        delivery = self.server.broadcast_paced(
+            message, 
+            urls, 
+            wave_size=wave_size, 
+            by_group=self.by_group_var.get(), 
+            **pacing
+        )
+        self.log_message(
+            f"{description} being sent to {delivery.total} clients in {delivery.wave_count} waves "
+            f"[broadcast {delivery.broadcast_id}]"
+        )
+        
+        self.active_delivery = delivery
+        if not self.delivery_polling:
+            self.delivery_polling = True
+            self.update_delivery_progress()
+    
+    def update_delivery_progress(self):
+        delivery = self.active_delivery
+        progress = delivery.progress()
+        self.delivery_progress.config(maximum=max(1, progress["total"]), value=progress["sent"] + progress["failed"])
+        
+        status = (
+            f"Wave {progress['waves_sent']}/{progress['wave_count']}: "
+            f"{progress['sent']} sent, {progress['failed']} failed, {progress['acked']} opened"
+        )
+        if progress["errors"]:
+            status += f", {progress['errors']} errors"
+        if not progress["done"]:
+            status += f" - next wave in {progress['next_wave_in']:.1f} s"
+        self.delivery_label.config(text=status)
+        
+        if progress["done"]:
+            word = "cancelled" if progress["cancelled"] else "finished"
+            self.log_message(
+                f"Broadcast {progress['id']} {word}: {progress['sent']} sent, {progress['failed']} failed "
+                f"in {delivery.end_time - delivery.start_time:.1f} s"
+            )
+            self.delivery_polling = False
+            return
+        
+        self.root.after(200, self.update_delivery_progress)
+    
+    def cancel_delivery(self):
+        if self.active_delivery and not self.active_delivery.is_done:
+            self.active_delivery.cancel()
+            self.log_message(f"Cancelling broadcast {self.active_delivery.broadcast_id}")
+    
     def save_current_link(self):
         url = self.url_entry.get().strip()
         if not url:
@@ -439,6 +1190,7 @@ class ServerGUI:
             if link_name:
                 self.server.saved_links[link_name] = url
                 self.server.save_links()
+                self.link_index.add(link_name, url)
                 self.refresh_saved_links()
                 self.log_message(f"Link saved: {link_name}")
                 name_window.destroy()
@@ -446,25 +1198,73 @@ class ServerGUI:
         ttk.Button(name_window, text="Save", command=save_and_close).pack(pady=10)
     
     def send_multiple_links(self):
-        text = self.multiple_links_text.get("1.0", tk.END)
-        urls = [line.strip() for line in text.splitlines() if line.strip()]
-        
-        if not urls:
+        formatted_urls = self.get_multiple_urls()
+        if not formatted_urls:
             self.log_message("Please enter at least one URL")
             return
         
+        try:
+            self.deliver("Multiple links", self.server.multiple_links_message(formatted_urls), formatted_urls)
+        except Exception as e:
+            self.log_message(f"Error sending multiple links: {e}")
+    
+    def get_multiple_urls(self):
+        text = self.multiple_links_text.get("1.0", tk.END)
+        urls = [line.strip() for line in text.splitlines() if line.strip()]
+        
         # Add http:// or https:// to URLs that don't have it
         formatted_urls = []
         for url in urls:
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
             formatted_urls.append(url)
+        return formatted_urls
+    
+    def prepare_link(self):
+        url = self.url_entry.get().strip()
+        if not url:
+            self.log_message("Please enter a URL")
+            return
         
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        self.prepare_urls("Link", [url], force=True)
+    
+    def prepare_multiple_links(self):
+        urls = self.get_multiple_urls()
+        if not urls:
+            self.log_message("Please enter at least one URL")
+            return
+        self.prepare_urls("Multiple links", urls, force=True)
+    
+    def prepare_urls(self, description, urls, force=False):
         try:
-            successful, failed = self.server.broadcast_multiple_links(formatted_urls)
-            self.log_message(f"Multiple links sent to {successful} clients ({failed} failed)")
+            result = self.server.prepare_links(urls, force)
+            if result:
+                successful, failed = result
+                self.log_message(f"{description} prepared on {successful} clients ({failed} failed)")
         except Exception as e:
-            self.log_message(f"Error sending multiple links: {e}")
+            self.log_message(f"Error preparing links: {e}")
+    
+    def on_saved_link_selected(self, event=None):
+        if not self.auto_prepare_var.get() or not self.server.is_running:
+            return
+        
+        # Wait until the selection settles so browsing the list is not broadcast
+        if self.auto_prepare_job:
+            self.root.after_cancel(self.auto_prepare_job)
+        self.auto_prepare_job = self.root.after(500, self.prepare_selected_links)
+    
+    def prepare_selected_links(self):
+        self.auto_prepare_job = None
+        urls = [url for name, url in self.get_selected_links()]
+        if urls:
+            self.prepare_urls("Selected links", urls)
+    
+    def on_link_set_selected(self, event=None):
+        name = self.link_set_combo.get()
+        if self.auto_prepare_var.get() and self.server.is_running and name in self.server.link_sets:
+            self.prepare_urls(f"Link set '{name}'", self.server.link_sets[name])
     
     def add_saved_link(self):
         name = self.link_name_entry.get().strip()
@@ -481,6 +1281,7 @@ class ServerGUI:
         
         self.server.saved_links[name] = url
         self.server.save_links()
+        self.link_index.add(name, url)
         self.refresh_saved_links()
         
         # Clear the entries
@@ -490,66 +1291,220 @@ class ServerGUI:
         self.log_message(f"Link added: {name}")
     
     def open_selected_link(self):
-        selected = self.links_tree.selection()
+        selected = self.get_selected_links()
         if not selected:
             self.log_message("Please select a link first")
             return
         
-        item = self.links_tree.item(selected[0])
-        name = item['values'][0]
-        url = item['values'][1]
+        name, url = selected[0]
         
         try:
-            successful, failed = self.server.broadcast_link(url)
-            self.log_message(f"Link '{name}' sent to {successful} clients ({failed} failed)")
+            self.deliver(f"Link '{name}'", self.server.link_message(url), [url])
         except Exception as e:
             self.log_message(f"Error sending link: {e}")
     
     def delete_selected_link(self):
-        selected = self.links_tree.selection()
+        selected = self.get_selected_links()
         if not selected:
             self.log_message("Please select a link first")
             return
         
-        item = self.links_tree.item(selected[0])
-        name = item['values'][0]
+        name = selected[0][0]
         
         # Remove from the saved links
         if name in self.server.saved_links:
             del self.server.saved_links[name]
             self.server.save_links()
+            self.link_index.remove(name)
+            self.selected_link_names.pop(name, None)
             self.refresh_saved_links()
             self.log_message(f"Link deleted: {name}")
     
+    def get_selected_links(self):
+        return [(name, self.server.saved_links[name]) for name in self.selected_link_names if name in self.server.saved_links]
+    
     def refresh_saved_links(self):
-        # Clear the treeview
-        for item in self.links_tree.get_children():
-            self.links_tree.delete(item)
+        # Re-run the current search but stay at the same scroll position
+        self.link_results = self.link_index.search(self.link_search_var.get())
+        self.render_saved_links()
+    
+    def search_saved_links(self):
+        self.link_results = self.link_index.search(self.link_search_var.get())
+        self.link_offset = 0
+        self.render_saved_links()
+    
+    def render_saved_links(self):
+        total = len(self.link_results)
+        self.link_offset = min(max(0, self.link_offset), max(0, total - self.visible_link_rows))
+        window = self.link_results[self.link_offset:self.link_offset + self.visible_link_rows]
+        
+        children = self.links_tree.get_children()
+        if children:
+            self.links_tree.delete(*children)
+        for name in window:
+            self.links_tree.insert("", tk.END, iid=name, values=(name, self.server.saved_links.get(name, "")))
+        self.links_tree.selection_set([name for name in window if name in self.selected_link_names])
+        
+        if total:
+            self.links_scrollbar.set(self.link_offset / total, (self.link_offset + len(window)) / total)
+        else:
+            self.links_scrollbar.set(0, 1)
+        self.link_count_label.config(text=f"{total} of {len(self.link_index)} links")
+    
+    def scroll_saved_links(self, *args):
+        if args[0] == 'moveto':
+            self.link_offset = int(float(args[1]) * len(self.link_results))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_link_rows
+            self.link_offset += amount
+        self.render_saved_links()
+    
+    def on_links_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.link_offset -= 3
+        else:
+            self.link_offset += 3
+        self.render_saved_links()
+        return "break"
+    
+    def on_links_tree_resize(self, event):
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight"))
+        except (TypeError, ValueError):
+            row_height = 20
+        
+        # Leave room for the heading row
+        rows = max(1, event.height // row_height - 1)
+        if rows != self.visible_link_rows:
+            self.visible_link_rows = rows
+            self.render_saved_links()
+    
+    def on_links_click(self, event):
+        # Shift or Control extends the selection, a plain click replaces it
+        self.link_click_extends = bool(event.state & 0x0005)
+    
+    def on_links_arrow_key(self, step):
+        children = self.links_tree.get_children()
+        if not children or self.links_tree.focus() != children[-1 if step > 0 else 0]:
+            # Not at the edge of the window, let the treeview move normally
+            self.link_click_extends = False
+            return None
+        
+        index = self.link_offset + (len(children) - 1 if step > 0 else 0) + step
+        if not 0 <= index < len(self.link_results):
+            return "break"
+        
+        name = self.link_results[index]
+        self.link_offset += step
+        self.selected_link_names = {name: None}
+        self.render_saved_links()
+        self.links_tree.focus(name)
+        self.on_saved_link_selected()
+        return "break"
+    
+    def on_links_tree_select(self, event=None):
+        visible = set(self.links_tree.get_children())
+        current = self.links_tree.selection()
+        
+        # Re-rendering restores the visible part of the selection; only
+        # react when the user actually changed it
+        if set(current) == {name for name in self.selected_link_names if name in visible}:
+            return
         
-        # Add all saved links
-        for name, url in self.server.saved_links.items():
-            self.links_tree.insert("", tk.END, values=(name, url))
+        if self.link_click_extends:
+            # Keep selected links that are scrolled out of view
+            selected = {name: None for name in self.selected_link_names if name not in visible}
+        else:
+            selected = {}
+        selected.update((name, None) for name in current)
+        
+        self.selected_link_names = selected
+        self.on_saved_link_selected()
+    
+    def save_selection_as_link_set(self):
+        selected = self.get_selected_links()
+        if not selected:
+            self.log_message("Please select the links for the set first")
+            return
+        
+        link_names = [name for name, url in selected]
+        
+        # Ask for a name
+        name_window = tk.Toplevel(self.root)
+        name_window.title("Save Link Set")
+        name_window.geometry("300x100")
+        name_window.resizable(False, False)
+        
+        ttk.Label(name_window, text="Name for this link set:").pack(padx=10, pady=5)
+        
+        name_entry = ttk.Entry(name_window, width=30)
+        name_entry.pack(padx=10, pady=5)
+        
+        def save_and_close():
+            set_name = name_entry.get().strip()
+            if set_name:
+                set_hash = self.server.create_link_set(set_name, link_names)
+                self.refresh_link_sets()
+                self.link_set_combo.set(set_name)
+                self.log_message(f"Link set saved: {set_name} ({len(link_names)} links, hash {set_hash})")
+                name_window.destroy()
+        
+        ttk.Button(name_window, text="Save", command=save_and_close).pack(pady=10)
+    
+    def open_link_set(self):
+        name = self.link_set_combo.get()
+        if not name:
+            self.log_message("Please choose a link set first")
+            return
+        
+        try:
+            self.deliver(f"Link set '{name}'", self.server.link_set_message(name), self.server.link_sets[name])
+        except Exception as e:
+            self.log_message(f"Error sending link set: {e}")
+    
+    def delete_link_set(self):
+        name = self.link_set_combo.get()
+        if not name:
+            self.log_message("Please choose a link set first")
+            return
+        
+        self.server.delete_link_set(name)
+        self.refresh_link_sets()
+        self.log_message(f"Link set deleted: {name}")
+    
+    def refresh_link_sets(self):
+        names = list(self.server.link_sets.keys())
+        self.link_set_combo['values'] = names
+        if self.link_set_combo.get() not in names:
+            self.link_set_combo.set(names[0] if names else "")
     
     def save_settings(self):
         try:
             host = self.host_entry.get().strip()
             port = int(self.port_entry.get().strip())
             
-            # Save the new settings
-            self.server.host = host
-            self.server.port = port
-            
-            # If the server is running, restart it
-            was_running = self.server.is_running
-            if was_running:
-                self.server.stop_server()
-            
-            if was_running:
-                self.server.start_server()
-            
-            self.log_message(f"Settings saved. Server will use {host}:{port}")
+            # Apply the new settings; connected clients stay connected
+            result = self.server.reconfigure(host, port)
+            self.log_message(f"Settings saved. {result}")
         except Exception as e:
             self.log_message(f"Error saving settings: {e}")
+            if not self.server.is_running:
+                self.status_label.config(text="Server Status: Stopped")
+    
+    def restart_server(self):
+        try:
+            result = self.server.hand_off()
+        except Exception as e:
+            self.log_message(f"Error restarting server: {e}")
+            return
+        
+        print(result)
+        
+        # The new process opens its own window and keeps serving
+        self.server.close_logs()
+        self.root.destroy()
     
     def update_client_count(self):
         if hasattr(self, 'client_count_label'):
@@ -561,25 +1516,95 @@ class ServerGUI:
             self.root.after(2000, self.update_client_count)
     
     def log_message(self, message):
-        # Enable the widget to insert text
-        self.log_text.config(state=tk.NORMAL)
-        
-        # Add timestamp and message
-        import datetime
+        # Only timestamp and queue here; this may run on a network thread
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.log_queue.put(f"[{timestamp}] {message}\n")
+    
+    def process_log_queue(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
         
-        # Auto-scroll to the end
-        self.log_text.see(tk.END)
+        if lines:
+            # Enable the widget to insert text
+            self.log_text.config(state=tk.NORMAL)
+            
+            # Insert the whole batch at once
+            self.log_text.insert(tk.END, ''.join(lines))
+            
+            # Auto-scroll to the end
+            self.log_text.see(tk.END)
+            
+            # Disable the widget again
+            self.log_text.config(state=tk.DISABLED)
         
-        # Disable the widget again
-        self.log_text.config(state=tk.DISABLED)
+        self.root.after(100, self.process_log_queue)
+    
+    def on_close(self):
+        self.server.stop_server()
+        self.server.close_logs()
+        self.root.destroy()
+
+
+def run_headless(server):
+    """Run without a window. Send SIGUSR1 to restart without disconnecting."""
+    if not server.is_running:
+        print(server.start_server())
+    
+    stop_event = threading.Event()
+    restart_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: restart_event.set())
+    
+    handed_off = False
+    try:
+        while not stop_event.is_set():
+            if not restart_event.wait(0.5):
+                continue
+            restart_event.clear()
+            try:
+                print(server.hand_off(['--headless']))
+                handed_off = True
+                break
+            except Exception as e:
+                print(f"Error restarting server: {e}")
+    except KeyboardInterrupt:
+        pass
+    
+    if not handed_off:
+        print(server.stop_server())
+    server.close_logs()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Lab Control Server")
+    parser.add_argument('--headless', action='store_true', help="Run without the GUI")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=9999, help="Port to listen on")
+    parser.add_argument('--record', metavar='PATH', help="Record all traffic to a capture file for replay.py")
+    parser.add_argument('--takeover', metavar='PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    server = LabControlServer(args.host, args.port, record_path=args.record)
+    
+    # Started by a running server that is handing over its connections
+    takeover_result = server.take_over(args.takeover) if args.takeover else None
+    
+    if args.headless:
+        if takeover_result:
+            print(takeover_result)
+        run_headless(server)
+        return
+    
     root = tk.Tk()
-    app = ServerGUI(root)
-    root.protocol("WM_DELETE_WINDOW", lambda: (app.server.stop_server(), root.destroy()))
+    app = ServerGUI(root, server)
+    if takeover_result:
+        app.log_message(takeover_result)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+# test_linkindex.py - Tests for searching saved links as the user types
+#
+# Run with: python -m unittest test_linkindex
+
+import random
+import unittest
+
+from linkindex import LinkIndex
+
+
+def brute_force(links, query):
+    """The expected result of LinkIndex.search(), computed the slow way."""
+    query = query.strip().lower()
+    matches = [name for name, url in links.items() if query in f"{name}\t{url}".lower().replace('\n', ' ')]
+    prefix = [name for name in matches if name.lower().startswith(query)]
+    return prefix + [name for name in matches if not name.lower().startswith(query)]
+
+
+class LinkIndexSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = LinkIndex({
+            "Math quiz": "https://quiz.example.com/math",
+            "Quiz archive": "https://archive.example.com",
+            "Reading": "https://books.example.org/quiz",
+            "Science": "https://science.example.com",
+        })
+
+    def test_name_prefix_matches_come_first(self):
+        self.assertEqual(self.index.search("quiz"), ["Quiz archive", "Math quiz", "Reading"])
+
+    def test_search_is_case_insensitive_and_covers_urls(self):
+        self.assertEqual(self.index.search("  EXAMPLE.ORG "), ["Reading"])
+
+    def test_empty_query_lists_every_link_in_order(self):
+        self.assertEqual(self.index.search(""), ["Math quiz", "Quiz archive", "Reading", "Science"])
+
+    def test_typing_narrows_results(self):
+        self.assertEqual(self.index.search("s"), ["Science", "Math quiz", "Quiz archive", "Reading"])
+        self.assertEqual(self.index.search("sc"), ["Science"])
+        self.assertEqual(self.index.search("sci"), ["Science"])
+
+    def test_backspace_widens_results_again(self):
+        self.index.search("quiz")
+        self.index.search("quiz a")
+        self.assertEqual(self.index.search("quiz"), ["Quiz archive", "Math quiz", "Reading"])
+        self.assertEqual(self.index.search("qu"), ["Quiz archive", "Math quiz", "Reading"])
+
+
+class LinkIndexUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.links = {
+            "Math quiz": "https://quiz.example.com/math",
+            "Reading": "https://books.example.org",
+            "Science": "https://science.example.com",
+        }
+        self.index = LinkIndex(self.links)
+        self.index.search("")
+
+    def test_added_link_is_found_while_filtering(self):
+        self.index.search("qu")
+        self.index.add("Quiz archive", "https://archive.example.com")
+        self.assertEqual(self.index.search("qu"), ["Quiz archive", "Math quiz"])
+        self.assertEqual(self.index.search("quiz a"), ["Quiz archive"])
+
+    def test_removed_link_is_dropped_while_filtering(self):
+        self.index.search("example")
+        self.index.remove("Reading")
+        self.assertEqual(self.index.search("example"), ["Math quiz", "Science"])
+        self.assertEqual(self.index.search("example.com"), ["Math quiz", "Science"])
+
+    def test_removing_first_and_last_links(self):
+        self.index.remove("Math quiz")
+        self.index.remove("Science")
+        self.assertEqual(self.index.search(""), ["Reading"])
+        self.assertEqual(self.index.search("read"), ["Reading"])
+        self.index.remove("Reading")
+        self.assertEqual(self.index.search("read"), [])
+        self.index.add("Reading", "https://books.example.org")
+        self.assertEqual(self.index.search("read"), ["Reading"])
+
+    def test_removing_unknown_name_does_nothing(self):
+        self.index.remove("Missing")
+        self.assertEqual(len(self.index), 3)
+
+    def test_overwriting_a_name_keeps_its_place(self):
+        self.index.search("math")
+        self.index.add("Math quiz", "https://algebra.example.com")
+        self.assertEqual(self.index.search("math"), ["Math quiz"])
+        self.assertEqual(self.index.search("quiz.example"), [])
+        self.assertEqual(self.index.search("algebra"), ["Math quiz"])
+        self.assertEqual(self.index.search(""), ["Math quiz", "Reading", "Science"])
+
+    def test_overwrite_that_starts_matching_the_current_query(self):
+        self.index.search("books")
+        self.index.add("Science", "https://books.example.com/science")
+        self.assertEqual(self.index.search("books"), ["Reading", "Science"])
+
+    def test_overwrite_that_stops_matching_the_current_query(self):
+        self.index.search("books")
+        self.index.add("Reading", "https://library.example.org")
+        self.assertEqual(self.index.search("books"), [])
+
+    def test_updates_match_a_fresh_index(self):
+        random.seed(7)
+        words = ["quiz", "math", "art", "example", "lab", "Quest", "music"]
+        links = dict(self.links)
+        queries = ["", "a", "ar", "art", "q", "qu", "e", "ex", "exam", ".com", "m"]
+
+        for step in range(300):
+            name = f"{random.choice(words)} {random.randrange(20)}"
+            if random.random() < 0.35 and name in links:
+                del links[name]
+                self.index.remove(name)
+            else:
+                url = f"https://{random.choice(words)}.example.com/{random.choice(words)}"
+                links[name] = url
+                self.index.add(name, url)
+
+            query = random.choice(queries)
+            self.assertEqual(self.index.search(query), brute_force(links, query), f"step {step}")
+
+            fresh = LinkIndex(links)
+            fresh.rebuild()
+            self.assertEqual(self.index.haystack, fresh.haystack)
+            self.assertEqual(self.index.line_starts, fresh.line_starts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# test_protocol.py - Tests for splitting the received byte stream into messages
+#
+# Run with: python -m unittest test_protocol
+
+import json
+import unittest
+
+from protocol import MAX_BUFFERED, MessageReader, encode_message
+
+
+class MessageReaderTest(unittest.TestCase):
+    def test_messages_back_to_back_without_newlines(self):
+        reader = MessageReader()
+        data = b'{"action":"ack","id":"a"}{"action":"ack","id":"b"}'
+        self.assertEqual(reader.feed(data), [{"action": "ack", "id": "a"}, {"action": "ack", "id": "b"}])
+
+    def test_message_split_across_reads(self):
+        reader = MessageReader()
+        data = encode_message({"action": "open_link", "url": "https://example.com/{x}"})
+        self.assertEqual(reader.feed(data[:10]), [])
+        self.assertEqual(reader.feed(data[10:20]), [])
+        self.assertEqual(reader.feed(data[20:]), [{"action": "open_link", "url": "https://example.com/{x}"}])
+
+    def test_partial_string_is_not_malformed(self):
+        reader = MessageReader()
+        self.assertEqual(reader.feed(b'{"action": "ope'), [])
+        self.assertEqual(reader.feed(b'n_link", "url": "u"}'), [{"action": "open_link", "url": "u"}])
+
+    def test_multibyte_character_split_across_reads(self):
+        reader = MessageReader()
+        data = '{"name": "Übung"}'.encode('utf-8')
+        split = data.index('Ü'.encode('utf-8')) + 1
+        self.assertEqual(reader.feed(data[:split]), [])
+        self.assertEqual(reader.feed(data[split:]), [{"name": "Übung"}])
+
+    def test_plain_text(self):
+        reader = MessageReader()
+        self.assertEqual(reader.feed(b'hello {"action":"ack"}'), ["hello", {"action": "ack"}])
+
+    def test_malformed_object_does_not_block_later_messages(self):
+        reader = MessageReader()
+        self.assertEqual(reader.feed(b'{bad json}'), ["{bad json}"])
+        ack = encode_message({"action": "ack", "id": "a"})
+        self.assertEqual(reader.feed(ack), [{"action": "ack", "id": "a"}])
+
+    def test_malformed_object_followed_by_valid_one_in_same_read(self):
+        reader = MessageReader()
+        data = b'{"a": 1,}' + encode_message({"action": "ack"})
+        self.assertEqual(reader.feed(data), ['{"a": 1,}', {"action": "ack"}])
+
+    def test_unbalanced_malformed_line_is_skipped_at_newline(self):
+        reader = MessageReader()
+        data = b'{bad\n' + encode_message({"action": "ack"})
+        self.assertEqual(reader.feed(data), ["{bad", {"action": "ack"}])
+
+    def test_braces_inside_strings_are_ignored(self):
+        reader = MessageReader()
+        self.assertEqual(reader.feed(b'{"text": "}{", bad}'), ['{"text": "}{", bad}'])
+
+    def test_oversized_partial_message_is_dropped(self):
+        reader = MessageReader()
+        self.assertEqual(reader.feed(b'{"urls": ["' + b'x' * (MAX_BUFFERED + 1)), [])
+        self.assertEqual(reader.buffer, '')
+        self.assertEqual(reader.feed(encode_message({"action": "ack"})), [{"action": "ack"}])
+
+
+class EncodeMessageTest(unittest.TestCase):
+    def test_compact_and_newline_terminated(self):
+        data = encode_message({"action": "ack", "ok": True})
+        self.assertEqual(data, b'{"action":"ack","ok":true}\n')
+        self.assertEqual(json.loads(data), {"action": "ack", "ok": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# waves.py - Paced delivery of a broadcast in waves
+
+import threading
+import time
+
+from protocol import encode_message
+
+DEFAULT_RATE = 50  # clients per second when neither rate nor spread is given
+MAX_SLOWDOWN = 8  # never wait more than 8x the configured interval
+
+
+class WaveDelivery:
+    """Send one broadcast to a fixed list of clients in paced waves.
+
+    Runs on its own thread so the caller never blocks. The interval between
+    waves comes from either a rate (clients per second) or a total spread
+    window (seconds), and adapts to how clients respond: errors double the
+    interval, a growing backlog of unacknowledged clients stretches it, and
+    clean waves shrink it back towards the configured pace.
+    """
+
+    def __init__(self, server, broadcast_id, message, targets, wave_size=20, rate=None, spread=None):
+        self.server = server
+        self.broadcast_id = broadcast_id
+        self.data = encode_message(dict(message, id=broadcast_id))
+        self.targets = targets  # [(address, socket)] in delivery order
+        self.wave_size = max(1, wave_size)
+        self.total = len(targets)
+        self.wave_count = (self.total + self.wave_size - 1) // self.wave_size
+
+        if spread:
+            self.base_interval = spread / max(1, self.wave_count - 1)
+        else:
+            self.base_interval = self.wave_size / (rate or DEFAULT_RATE)
+        self.interval = self.base_interval
+
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self.acked = 0
+        self.errors = 0
+        self.errors_at_last_wave = 0
+        self.waves_sent = 0
+        self.next_wave_time = None
+        self.start_time = None
+        self.end_time = None
+        self.is_done = False
+
+    def start(self):
+        self.start_time = time.time()
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        for index in range(self.wave_count):
+            if self.cancel_event.is_set():
+                break
+
+            wave = self.targets[index * self.wave_size:(index + 1) * self.wave_size]
+            for address, client_socket in wave:
+                ok = self.server.send_to_client(self.broadcast_id, address, client_socket, self.data)
+                with self.lock:
+                    if ok:
+                        self.sent += 1
+                    else:
+                        self.failed += 1
+                        self.errors += 1
+            self.waves_sent += 1
+
+            if index < self.wave_count - 1:
+                self.adapt()
+                self.next_wave_time = time.time() + self.interval
+                self.cancel_event.wait(self.interval)
+
+        self.next_wave_time = None
+        self.end_time = time.time()
+        self.is_done = True
+
+    def adapt(self):
+        with self.lock:
+            new_errors = self.errors - self.errors_at_last_wave
+            self.errors_at_last_wave = self.errors
+            # Only trust the backlog once clients are known to send acks
+            backlog = self.sent - self.acked if self.acked else 0
+
+        slowest = max(self.base_interval * MAX_SLOWDOWN, 1.0)
+        if new_errors:
+            self.interval = min(max(self.interval * 2, 0.5), slowest)
+        elif backlog > 2 * self.wave_size:
+            # More than the wave just sent is still waiting to be opened
+            self.interval = min(max(self.interval * 1.5, 0.25), slowest)
+        else:
+            self.interval = max(self.base_interval, self.interval * 0.8)
+
+    def on_ack(self, ok):
+        with self.lock:
+            self.acked += 1
+            if not ok:
+                self.errors += 1
+
+    def progress(self):
+        next_wave_time = self.next_wave_time
+        with self.lock:
+            return {
+                "id": self.broadcast_id,
+                "total": self.total,
+                "sent": self.sent,
+                "failed": self.failed,
+                "acked": self.acked,
+                "errors": self.errors,
+                "waves_sent": self.waves_sent,
+                "wave_count": self.wave_count,
+                "interval": self.interval,
+                "next_wave_in": max(0.0, next_wave_time - time.time()) if next_wave_time else 0.0,
+                "done": self.is_done,
+                "cancelled": self.cancel_event.is_set(),
+            }